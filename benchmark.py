@@ -0,0 +1,46 @@
+import logging
+import mandelbrot
+
+
+def start(arguments):
+    # Returns False when the results are slower than the baseline
+    logger = logging.getLogger('mandelbrot_visualisation')
+
+    results_file = arguments['benchmark_results']
+    baseline_file = arguments['benchmark_baseline']
+    compare_file = arguments['benchmark_compare']
+    threshold = arguments['regression_threshold']
+
+    if compare_file is not None:
+        # The results of an earlier run are compared instead of running
+        results = mandelbrot.benchmark.load_results(logger, compare_file)
+        if results is None:
+            return False
+    else:
+        with mandelbrot.benchmark.Benchmark(logger) as benchmark:
+            results = benchmark.run(
+                arguments['benchmark_engines'], arguments['benchmark_tasks'],
+                arguments['benchmark_sizes'],
+                arguments['benchmark_iterations'],
+                arguments['benchmark_regions'],
+                arguments['benchmark_repeats'])
+
+        mandelbrot.benchmark.save_results(results, results_file)
+        logger.info('Benchmark results saved to %s' % results_file)
+
+    if baseline_file is None:
+        return True
+
+    baseline = mandelbrot.benchmark.load_results(logger, baseline_file)
+    if baseline is None:
+        return False
+
+    regressions = mandelbrot.benchmark.compare_results(
+        logger, results, baseline, threshold)
+    if regressions:
+        logger.error('%s of %s cases are slower than the baseline'
+                     % (len(regressions), len(results)))
+        return False
+
+    logger.info('No case is slower than the baseline')
+    return True
@@ -1,3 +1,4 @@
+import cProfile
 import logging
 import mandelbrot
 
@@ -5,17 +6,140 @@ import mandelbrot
 def start(arguments):
     logger = logging.getLogger('mandelbrot_visualisation')
 
+    metrics_file = arguments['metrics_file']
+    trace_file = arguments['trace_file']
+    profile_file = arguments['profile_file']
+
+    metrics = None
+    if metrics_file is not None or trace_file is not None:
+        metrics = mandelbrot.Metrics()
+
+    # Only the main process is profiled, the workers are in the metrics
+    profiler = None
+    if profile_file is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        saved = _run(arguments, metrics)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+            logger.info('Profile saved to %s' % profile_file)
+
+    if metrics is not None:
+        _log_metrics(logger, metrics.summary())
+        if metrics_file is not None:
+            metrics.save(metrics_file)
+            logger.info('Metrics saved to %s' % metrics_file)
+        if trace_file is not None:
+            metrics.save_chrome_trace(trace_file)
+            logger.info('Trace saved to %s' % trace_file)
+
+    return saved
+
+
+def _log_metrics(logger, summary):
+    for name, stage_time in sorted(summary['stages'].items()):
+        logger.info('Stage %s: %.5fs' % (name, stage_time))
+
+    for name, jobs in sorted(summary['jobs'].items()):
+        logger.info('%s: %s jobs, %.5fs mean, %.5fs max, %s iterations'
+                    % (name, jobs['jobs'], jobs['mean_time'],
+                       jobs['max_time'], jobs['iterations']))
+
+    workers = summary['workers']
+    logger.info(('%s workers, %.1f%% utilised, %.2f imbalance ' +
+                 '(the busiest worker over the mean)')
+                % (workers['count'], 100 * workers['utilisation'],
+                   workers['imbalance']))
+
+    peak_memory = summary['peak_memory_mb']
+    logger.info('Peak memory: %s MB main, %s MB worker'
+                % (peak_memory['main'], peak_memory['workers']))
+
+
+def _run(arguments, metrics):
+    # Returns True once the output is saved, None on errors
+    logger = logging.getLogger('mandelbrot_visualisation')
+
     width = arguments['width']
     height = arguments['height']
     real_axis_range = arguments['real_axis_range']
     imag_axis_range = arguments['imag_axis_range']
     tasks = arguments['tasks']
+    tile_size = arguments['tile_size']
     gpu = arguments['gpu']
+    numpy = arguments['numpy']
+    subdivision = arguments['subdivision']
+    max_iterations = arguments['max_iterations']
+    escape_radius = arguments['escape_radius']
+    color_density = arguments['color_density']
     output_file = arguments['output_file']
+    cache = mandelbrot.get_tile_cache(
+        arguments['cache_size'], arguments['cache_dir'])
+
+    band_size = arguments['band_size']
+    field_file = arguments['field_file']
+    recolor_field_file = arguments['recolor_field_file']
+    color_scheme = arguments['color_scheme']
+    zoom = arguments['zoom']
+    supersampling = arguments['supersampling']
+    adaptive_sampling = arguments['adaptive_sampling']
+
+    if band_size and not output_file.lower().endswith('.png'):
+        logger.error('Only PNG output files can be written in bands.')
+        return
+
+    if band_size and (gpu or subdivision):
+        logger.error('Writing in bands is only available with the CPU ' +
+                     'or NumPy acceleration without subdivision.')
+        return
+
+    with mandelbrot.Mandelbrot(cache, metrics) as mandelbrot_generator:
+        if recolor_field_file is not None:
+            image = mandelbrot_generator.render_field(
+                recolor_field_file, tasks, numpy, color_density,
+                color_scheme)
+            if image is None:
+                return
+
+            with mandelbrot.metrics.stage(metrics, 'saving'):
+                image.save(output_file)
+            logger.info('Visualisation saved to %s' % output_file)
+            return True
+
+        if zoom is not None:
+            center, scale_range, frames = zoom
+            mandelbrot_generator.generate_zoom(
+                width, height, center, scale_range, frames, output_file,
+                tasks, numpy, tile_size, max_iterations, escape_radius,
+                color_density, color_scheme, arguments['zoom_tolerance'])
+            return True
+
+        if band_size:
+            saved_file = mandelbrot_generator.generate_bands(
+                width, height, real_axis_range, imag_axis_range,
+                output_file, band_size, tasks, numpy, tile_size,
+                max_iterations, escape_radius, color_density, field_file,
+                color_scheme, supersampling, adaptive_sampling)
+            if saved_file is None:
+                return
+
+            logger.info('Visualisation saved to %s' % saved_file)
+            return True
 
-    mandelbrot_generator = mandelbrot.Mandelbrot()
-    image = mandelbrot_generator.generate(
-        width, height, real_axis_range, imag_axis_range, tasks, gpu)
+        image = mandelbrot_generator.generate(
+            width, height, real_axis_range, imag_axis_range, tasks, gpu,
+            numpy, tile_size, subdivision, max_iterations, escape_radius,
+            color_density, field_filename=field_file,
+            color_scheme=color_scheme, center=arguments['center'],
+            scale=arguments['scale'], supersampling=supersampling,
+            adaptive_sampling=adaptive_sampling)
+        if image is None:
+            return
 
-    image.save(output_file)
+    with mandelbrot.metrics.stage(metrics, 'saving'):
+        image.save(output_file)
     logger.info('Visualisation saved to %s' % output_file)
+    return True
@@ -0,0 +1,56 @@
+import logging
+import mandelbrot
+
+
+def start(arguments):
+    # Started with a coordinator address, the process is a worker, otherwise
+    # the coordinator, which waits for the workers and saves the image.
+    # Returns False when the coordinator could not run.
+    logger = logging.getLogger('mandelbrot_visualisation')
+
+    numpy = arguments['numpy']
+    tasks = arguments['tasks']
+
+    if arguments['connect'] is not None:
+        mandelbrot.distributed.start_workers(
+            logger, arguments['connect'], tasks, numpy)
+        return True
+
+    try:
+        coordinator = mandelbrot.distributed.Coordinator(
+            logger, arguments['listen'], arguments['tile_timeout'])
+    except OSError as ex:
+        logger.error(ex)
+        return False
+
+    width = arguments['width']
+    height = arguments['height']
+    tile_size = arguments['tile_size']
+    max_iterations = arguments['max_iterations']
+    escape_radius = arguments['escape_radius']
+    color_density = arguments['color_density']
+    color_scheme = arguments['color_scheme']
+    output_file = arguments['output_file']
+    zoom = arguments['zoom']
+
+    with coordinator, mandelbrot.Mandelbrot() as mandelbrot_generator:
+        try:
+            if zoom is not None:
+                center, scale_range, frames = zoom
+                mandelbrot_generator.generate_zoom(
+                    width, height, center, scale_range, frames, output_file,
+                    tasks, numpy, tile_size, max_iterations, escape_radius,
+                    color_density, color_scheme, coordinator=coordinator)
+                return True
+
+            image = mandelbrot_generator.generate_distributed(
+                coordinator, width, height, arguments['real_axis_range'],
+                arguments['imag_axis_range'], tasks, numpy, tile_size,
+                max_iterations, escape_radius, color_density, color_scheme)
+        except mandelbrot.distributed.TileFailed as ex:
+            logger.error(ex)
+            return False
+
+    image.save(output_file)
+    logger.info('Visualisation saved to %s' % output_file)
+    return True
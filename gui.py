@@ -5,6 +5,7 @@ LOGGER = logging.getLogger('mandelbrot_visualisation')
 PYQT_VERSION = None
 GUI_AVAILABLE = False
 GUI_OBJECT = object
+THREAD_OBJECT = object
 
 try:
     import PyQt5
@@ -28,17 +29,20 @@ if PYQT_VERSION in [4, 5]:
         from PyQt5.QtWidgets import (
             QApplication, QWidget, QLabel, QLineEdit, QPushButton,
             QVBoxLayout, QMessageBox, QBoxLayout, QInputDialog,
-            QCheckBox)
+            QCheckBox, QProgressBar)
+        from PyQt5.QtCore import QThread, pyqtSignal
         from PyQt5 import QtGui
     elif PYQT_VERSION == 4:
         from PyQt4 import QtGui
         from PyQt4.QtGui import (
             QApplication, QWidget, QLabel, QLineEdit, QPushButton,
             QVBoxLayout, QMessageBox, QBoxLayout, QInputDialog,
-            QCheckBox)
+            QCheckBox, QProgressBar)
+        from PyQt4.QtCore import QThread, pyqtSignal
 
     GUI_AVAILABLE = True
     GUI_OBJECT = QWidget
+    THREAD_OBJECT = QThread
 
 import mandelbrot
 
@@ -51,6 +55,44 @@ class InvalidInputError(Exception):
     pass
 
 
+class GenerationThread(THREAD_OBJECT):
+
+    if GUI_AVAILABLE:
+        image_ready = pyqtSignal(object, bool)
+        progress_changed = pyqtSignal(int, int)
+
+    def __init__(self, mandelbrot_generator, arguments, progressive,
+                 parent=None):
+        super(GenerationThread, self).__init__(parent)
+        self._mandelbrot = mandelbrot_generator
+        self._arguments = arguments
+        self._progressive = progressive
+        self.cancel_token = mandelbrot.CancellationToken()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def run(self):
+        (width, height, real_axis_range, imag_axis_range,
+         tasks, gpu, numpy) = self._arguments
+
+        try:
+            if self._progressive:
+                for image in self._mandelbrot.generate_progressive(
+                        width, height, real_axis_range, imag_axis_range,
+                        tasks, progress=self.progress_changed.emit,
+                        cancel=self.cancel_token):
+                    self.image_ready.emit(image, image.size == (width, height))
+            else:
+                image = self._mandelbrot.generate(
+                    width, height, real_axis_range, imag_axis_range, tasks,
+                    gpu, numpy, progress=self.progress_changed.emit,
+                    cancel=self.cancel_token)
+                self.image_ready.emit(image, True)
+        except mandelbrot.GenerationCancelled:
+            LOGGER.debug('Mandelbrot set generation cancelled')
+
+
 class Window(GUI_OBJECT):
 
     def __init__(self, parent=None, arguments={}):
@@ -58,8 +100,12 @@ class Window(GUI_OBJECT):
         self._logger = LOGGER
         self._arguments = arguments
 
-        self._mandelbrot = mandelbrot.Mandelbrot()
+        self._mandelbrot = mandelbrot.Mandelbrot(mandelbrot.get_tile_cache(
+            self._get_argument('cache_size', 0),
+            self._get_argument('cache_dir')))
         self._image = None
+        self._thread = None
+        self._drag_start = None
         self._label_image_maxsize = 500
         self._create_layout()
 
@@ -120,12 +166,28 @@ class Window(GUI_OBJECT):
             self._gpu_checkbox.setChecked(gpu_value)
             bottom_layout_top.addWidget(self._gpu_checkbox)
 
+        self._numpy_checkbox = None
+        if mandelbrot.mandelbrot_numpy.is_numpy_accelerated():
+            self._numpy_checkbox = QCheckBox('NumPy acceleration')
+            self._numpy_checkbox.setChecked(
+                bool(self._get_argument('numpy', 0)))
+            bottom_layout_top.addWidget(self._numpy_checkbox)
+
         bottom_layout_bottom = QVBoxLayout()
         self._process_btn = QPushButton('Process')
         self._process_btn.setDefault(True)
         bottom_layout_bottom.addWidget(self._process_btn)
         self._process_btn.clicked.connect(self._process_mandelbrot)
 
+        self._progress_bar = QProgressBar()
+        self._progress_bar.setVisible(False)
+        bottom_layout_bottom.addWidget(self._progress_bar)
+
+        self._cancel_btn = QPushButton('Cancel')
+        self._cancel_btn.clicked.connect(self._stop_generation)
+        self._cancel_btn.setVisible(False)
+        bottom_layout_bottom.addWidget(self._cancel_btn)
+
         image_layout = QVBoxLayout()
         self._image_label = QLabel()
         self._image_label.setVisible(False)
@@ -197,37 +259,136 @@ class Window(GUI_OBJECT):
             gpu = True \
                 if self._gpu_checkbox and self._gpu_checkbox.isChecked() \
                 else False
+            numpy = True \
+                if self._numpy_checkbox and self._numpy_checkbox.isChecked() \
+                else False
         except InvalidInputError as ex:
             self._logger.error(ex)
             return
 
-        self._image_label.setVisible(False)
-        self._process_btn.setVisible(False)
+        self._save_btn.setVisible(False)
 
         self._logger.debug(
             'Chosed: %s, %s, %s, %s, %s'
             % (tasks_count, width, height, real_axis_range, imag_axis_range))
 
-        self._image = self._mandelbrot.generate(
-            width, height, real_axis_range, imag_axis_range, tasks_count, gpu)
+        # A newer request replaces the running one
+        self._stop_generation()
+
+        self._thread = GenerationThread(
+            self._mandelbrot,
+            (width, height, real_axis_range, imag_axis_range,
+             tasks_count, gpu, numpy),
+            numpy and not gpu)
+        self._thread.image_ready.connect(self._show_generated_image)
+        self._thread.progress_changed.connect(self._show_progress)
+        self._thread.finished.connect(
+            lambda thread=self._thread: self._generation_finished(thread))
+
+        self._progress_bar.setValue(0)
+        self._progress_bar.setVisible(True)
+        self._cancel_btn.setVisible(True)
+        self._thread.start()
+
+    def _stop_generation(self):
+        if self._thread is None:
+            return
+
+        self._thread.cancel()
+        self._thread.wait()
+        self._thread.cancel_token.release()
+        self._thread = None
+
+        self._progress_bar.setVisible(False)
+        self._cancel_btn.setVisible(False)
 
-        image_ratio = height / float(width)
+    def _generation_finished(self, thread):
+        thread.cancel_token.release()
+        if thread is not self._thread:
+            return
+
+        self._thread = None
+        self._progress_bar.setVisible(False)
+        self._cancel_btn.setVisible(False)
+
+    def _show_progress(self, done, total):
+        self._progress_bar.setMaximum(total)
+        self._progress_bar.setValue(done)
+
+    def _show_generated_image(self, image, final):
+        width, height = image.size
+        self._show_image(image, height / float(width))
+
+        if final:
+            self._image = image
+            self._save_btn.setVisible(True)
+
+    def _show_image(self, image, image_ratio):
         label_image_width = self._label_image_maxsize
         label_image_height = int(label_image_width * image_ratio)
 
-        data = self._image.resize(
+        # The previews are smaller than the label, they are scaled up as is
+        resample = Image.LANCZOS \
+            if image.size[0] >= label_image_width else Image.NEAREST
+        data = image.resize(
             (label_image_width, label_image_height),
-            Image.ANTIALIAS).tobytes('raw', 'RGB')
+            resample).tobytes('raw', 'RGB')
         qt_image = QtGui.QImage(
             data, label_image_width, label_image_height,
             QtGui.QImage.Format_RGB888)
         pixmap = QtGui.QPixmap.fromImage(qt_image)
         self._image_label.setPixmap(pixmap)
-
-        self._process_btn.setVisible(True)
-        self._save_btn.setVisible(True)
         self._image_label.setVisible(True)
 
+    def mousePressEvent(self, event):
+        self._drag_start = None
+        if self._image is not None and \
+                self._image_label.geometry().contains(event.pos()):
+            self._drag_start = event.pos()
+
+    def mouseReleaseEvent(self, event):
+        if self._drag_start is None:
+            return
+
+        drag = event.pos() - self._drag_start
+        self._drag_start = None
+        self._pan_view(drag.x(), drag.y())
+
+    def _pan_view(self, drag_x, drag_y):
+        # The plane is moved by whole pixels of the image, so only the
+        # pixels which the image did not show before are generated
+        width, height = self._image.size
+        scale = width / float(self._label_image_maxsize)
+        shift_x = -int(round(drag_x * scale))
+        shift_y = -int(round(drag_y * scale))
+        if not shift_x and not shift_y:
+            return
+
+        try:
+            real_axis_range = (float(self._range_real1_input.text()),
+                               float(self._range_real2_input.text()))
+            imag_axis_range = (float(self._range_imag1_input.text()),
+                               float(self._range_imag2_input.text()))
+        except ValueError as ex:
+            self._logger.error(ex)
+            return
+
+        real_shift = shift_x * (
+            real_axis_range[1] - real_axis_range[0]) / (width - 1)
+        imag_shift = shift_y * (
+            imag_axis_range[1] - imag_axis_range[0]) / (height - 1)
+        self._range_real1_input.setText(str(real_axis_range[0] + real_shift))
+        self._range_real2_input.setText(str(real_axis_range[1] + real_shift))
+        self._range_imag1_input.setText(str(imag_axis_range[0] + imag_shift))
+        self._range_imag2_input.setText(str(imag_axis_range[1] + imag_shift))
+
+        self._process_mandelbrot()
+
+    def closeEvent(self, event):
+        self._stop_generation()
+        self._mandelbrot.close()
+        super(Window, self).closeEvent(event)
+
     def _save_visualisation(self):
         if not self._image:
             self._save_btn.setVisible(False)
@@ -1,3 +1,5 @@
+import sys
+import decimal
 import logging
 
 LOGGER_FORMAT = '[%(asctime)-15s] [%(process)s] [%(levelname)s] %(message)s'
@@ -7,6 +9,9 @@ LOGGER = logging.getLogger('mandelbrot_visualisation')
 
 import gui
 import console
+import benchmark
+import server
+import distributed
 import mandelbrot
 
 
@@ -28,6 +33,67 @@ def get_arguments():
         help=('the real and imaginary axis range, ' +
               'example format: -2.0:1.0:-1.5:1.5'))
 
+    parser.add_argument(
+        '--center',
+        type=str,
+        default=None,
+        help=('the center of the plane with any number of digits for ' +
+              'deep zooms, instead of the plane, example format: ' +
+              '-0.743643887037151:0.131825904205330 (NumPy ' +
+              'acceleration required)'))
+
+    parser.add_argument(
+        '--scale',
+        type=float,
+        default=None,
+        help='the width of the real axis around the center, e.g. 1e-30')
+
+    parser.add_argument(
+        '--zoom', '-z',
+        type=str,
+        default=None,
+        help=('render the frames of a zoom into a point in console mode ' +
+              'instead of the plane, example format: ' +
+              '-0.743643:0.131825:3.0:0.0001:100 for the center, the ' +
+              'first and the last width of the real axis and the number ' +
+              'of frames'))
+
+    parser.add_argument(
+        '--zoom-tolerance',
+        type=float,
+        default=None,
+        help=('reuse the pixels of the previous frame of the zoom whose ' +
+              'smooth iteration count is known within this error ' +
+              '(NumPy acceleration mode only)'))
+
+    parser.add_argument(
+        '--iterations', '-i',
+        type=str,
+        default=str(mandelbrot.constants.MAX_ITERATIONS),
+        help=('the maximum number of iterations per point, or auto ' +
+              'to pick it from the zoom level'))
+
+    parser.add_argument(
+        '--escape-radius',
+        type=float,
+        default=mandelbrot.constants.ESCAPE_RADIUS,
+        help='the radius after which a point is considered escaped')
+
+    parser.add_argument(
+        '--color-density',
+        type=float,
+        default=None,
+        help=('the number of colors per iteration (default: derived ' +
+              'from the number of iterations)'))
+
+    parser.add_argument(
+        '--palette',
+        type=str,
+        default=None,
+        help=('the JSON file with the color scheme, as generated by ' +
+              'other/generate_color_scheme.py (default: ' +
+              'resources/color_scheme.json)'))
+
     parser.add_argument(
         '--tasks', '-t',
         type=int,
@@ -35,12 +101,76 @@ def get_arguments():
         help=('the number of concurrent CPU tasks to ' +
               'generate the visualisation'))
 
+    parser.add_argument(
+        '--tile-size',
+        type=str,
+        default='256x64',
+        help=('the size of the blocks the plane is split into for the ' +
+              'CPU tasks, example format: 256x64 (0 for the whole ' +
+              'width or height)'))
+
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=0,
+        help=('the memory in MB for keeping the generated tiles to reuse ' +
+              'them in the next views (0 for no cache, NumPy acceleration ' +
+              'mode only)'))
+
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        default=None,
+        help='the directory for keeping the generated tiles between the runs')
+
     parser.add_argument(
         '--output', '-o',
         type=str,
         default='mandelbrot.png',
         help='the output filename')
 
+    parser.add_argument(
+        '--save-field',
+        type=str,
+        default=None,
+        help=('the filename to save the iteration counts and |z| values ' +
+              'to in console mode, for rendering them again later'))
+
+    parser.add_argument(
+        '--recolor',
+        type=str,
+        default=None,
+        help=('the iteration field file saved with --save-field to render ' +
+              'again in console mode, instead of generating the plane'))
+
+    parser.add_argument(
+        '--band-size',
+        type=int,
+        default=0,
+        help=('the number of rows generated and written to the output ' +
+              'PNG file at once in console mode, so that the whole image ' +
+              'is never in memory (0 to generate the whole image at once)'))
+
+    parser.add_argument(
+        '--metrics',
+        type=str,
+        default=None,
+        help=('the JSON file the stage timers, the timings of the worker ' +
+              'jobs and the peak memory are saved to in console mode'))
+
+    parser.add_argument(
+        '--trace',
+        type=str,
+        default=None,
+        help=('the Chrome trace (chrome://tracing) file of the stages and ' +
+              'the worker jobs in console mode'))
+
+    parser.add_argument(
+        '--profile',
+        type=str,
+        default=None,
+        help='the cProfile file of the main process in console mode')
+
     parser.add_argument(
         '--quiet', '-q',
         type=int,
@@ -51,7 +181,97 @@ def get_arguments():
         '--mode', '-m',
         type=int,
         default=0,
-        help='0 for GUI, 1 for console mode')
+        help=('0 for GUI, 1 for console mode, 2 for benchmark mode, ' +
+              '3 for distributed mode, 4 for tile server mode'))
+
+    parser.add_argument(
+        '--listen',
+        type=str,
+        default='127.0.0.1:7700',
+        help=('the address the coordinator waits for the workers on in ' +
+              'distributed mode and the HTTP address in tile server ' +
+              'mode, example format: 0.0.0.0:7700'))
+
+    parser.add_argument(
+        '--connect',
+        type=str,
+        default=None,
+        help=('the address of the coordinator to work for in distributed ' +
+              'mode, example format: 192.168.0.10:7700, with one ' +
+              'connection per task'))
+
+    parser.add_argument(
+        '--tile-timeout',
+        type=float,
+        default=mandelbrot.distributed.TILE_TIMEOUT,
+        help=('the seconds after which the tile of a silent worker is ' +
+              'issued to another one in distributed mode'))
+
+    parser.add_argument(
+        '--benchmark-engines',
+        type=str,
+        default=None,
+        help=('the engines to benchmark, example format: cpu,numpy ' +
+              '(default: all available of cpu, numpy, subdivision, gpu)'))
+
+    parser.add_argument(
+        '--benchmark-tasks',
+        type=str,
+        default='1',
+        help='the numbers of tasks to benchmark, example format: 1,4')
+
+    parser.add_argument(
+        '--benchmark-sizes',
+        type=str,
+        default='512x512',
+        help='the sizes to benchmark, example format: 256x256,1024x1024')
+
+    parser.add_argument(
+        '--benchmark-iterations',
+        type=str,
+        default=str(mandelbrot.constants.MAX_ITERATIONS),
+        help=('the numbers of iterations to benchmark, example format: ' +
+              '256,1024'))
+
+    parser.add_argument(
+        '--benchmark-regions',
+        type=str,
+        default=','.join(mandelbrot.benchmark.REGIONS),
+        help=('the named regions to benchmark, example format: ' +
+              'full,elephant_valley'))
+
+    parser.add_argument(
+        '--benchmark-repeats',
+        type=int,
+        default=3,
+        help='the number of runs of every case, the fastest one counts')
+
+    parser.add_argument(
+        '--benchmark-results',
+        type=str,
+        default='benchmark.json',
+        help='the JSON or CSV file the benchmark results are saved to')
+
+    parser.add_argument(
+        '--benchmark-baseline',
+        type=str,
+        default=None,
+        help=('the JSON or CSV results of an earlier benchmark to compare ' +
+              'the results with'))
+
+    parser.add_argument(
+        '--benchmark-compare',
+        type=str,
+        default=None,
+        help=('the JSON or CSV results to compare with the baseline, ' +
+              'instead of running the benchmark'))
+
+    parser.add_argument(
+        '--regression-threshold',
+        type=float,
+        default=0.1,
+        help=('the fraction of the baseline pixels per second a case may ' +
+              'lose before it is a regression'))
 
     if mandelbrot.mandelbrot_gpu.is_gpu_accelerated():
         parser.add_argument(
@@ -60,6 +280,34 @@ def get_arguments():
             default=0,
             help='GPU acceleration mode')
 
+    if mandelbrot.mandelbrot_numpy.is_numpy_accelerated():
+        parser.add_argument(
+            '--numpy', '-n',
+            type=int,
+            default=0,
+            help='NumPy acceleration mode')
+
+        parser.add_argument(
+            '--subdivision',
+            type=int,
+            default=0,
+            help=('skip the inside of the regions with a uniform border ' +
+                  '(NumPy acceleration mode only)'))
+
+        parser.add_argument(
+            '--supersampling',
+            type=int,
+            default=1,
+            help=('average the colors of N x N samples per pixel ' +
+                  '(NumPy acceleration mode only)'))
+
+        parser.add_argument(
+            '--adaptive-sampling',
+            type=int,
+            default=0,
+            help=('supersample only the pixels on the edges between ' +
+                  'iteration counts'))
+
     parsed_args = parser.parse_args()
     return parsed_args
 
@@ -90,25 +338,200 @@ def parse_arguments():
         LOGGER.error(ex)
         return
 
+    if real_axis_range[0] == real_axis_range[1] or \
+            imag_axis_range[0] == imag_axis_range[1]:
+        LOGGER.error('The plane argument has an empty axis range.')
+        return
+
+    center = None
+    if arguments.center is not None:
+        center = tuple(arguments.center.split(':'))
+        if len(center) != 2 or arguments.scale is None:
+            LOGGER.error('The center argument is invalid or has no scale. ' +
+                         'Valid format: --center=-0.75:0.1 --scale 1e-20')
+            return
+
+        try:
+            list(map(decimal.Decimal, center))
+        except decimal.InvalidOperation as ex:
+            LOGGER.error(ex)
+            return
+
+        if not 0 < arguments.scale < 1e300:
+            LOGGER.error('The scale has to be a positive number.')
+            return
+
+    zoom = None
+    if arguments.zoom is not None:
+        zoom = arguments.zoom.split(':')
+        if len(zoom) != 5:
+            LOGGER.error('The zoom argument is invalid. ' +
+                         'Valid format: -0.75:0.1:3.0:0.001:100')
+            return
+
+        try:
+            zoom = (complex(float(zoom[0]), float(zoom[1])),
+                    (float(zoom[2]), float(zoom[3])), int(zoom[4]))
+        except Exception as ex:
+            LOGGER.error(ex)
+            return
+
+        if arguments.zoom_tolerance is not None and \
+                arguments.zoom_tolerance < 0:
+            LOGGER.error('The zoom tolerance can not be negative.')
+            return
+
+        if min(zoom[1]) <= 0 or zoom[2] <= 0:
+            LOGGER.error('The zoom widths and the number of frames ' +
+                         'have to be positive.')
+            return
+
+    tile_size = arguments.tile_size.split('x')
+    if len(tile_size) != 2:
+        LOGGER.error('The tile size argument is invalid. Valid format: 256x64')
+        return
+
+    try:
+        tile_size = tuple(map(int, tile_size))
+    except Exception as ex:
+        LOGGER.error(ex)
+        return
+
+    max_iterations = arguments.iterations
+    if max_iterations != 'auto':
+        try:
+            max_iterations = int(max_iterations)
+        except Exception as ex:
+            LOGGER.error(ex)
+            return
+
+        if max_iterations <= 0:
+            LOGGER.error('The number of iterations has to be positive.')
+            return
+
+    # The smooth iteration counts divide by the logarithm of the radius
+    if not arguments.escape_radius > 1:
+        LOGGER.error('The escape radius has to be larger than 1.')
+        return
+
+    color_scheme = None
+    if arguments.palette is not None:
+        color_scheme = mandelbrot.constants.load_color_scheme(
+            arguments.palette)
+        if not color_scheme:
+            LOGGER.error('The palette %s is missing or empty.'
+                         % arguments.palette)
+            return
+
+    if arguments.band_size < 0:
+        LOGGER.error('The band size argument is invalid. Valid format: 256')
+        return
+
+    if arguments.cache_size < 0:
+        LOGGER.error('The cache size argument is invalid. Valid format: 64')
+        return
+
+    try:
+        benchmark_tasks = list(map(int, arguments.benchmark_tasks.split(',')))
+        benchmark_sizes = [tuple(map(int, size.split('x')))
+                           for size in arguments.benchmark_sizes.split(',')]
+        benchmark_iterations = list(map(
+            int, arguments.benchmark_iterations.split(',')))
+    except ValueError as ex:
+        LOGGER.error(ex)
+        return
+
+    if any(len(size) != 2 for size in benchmark_sizes):
+        LOGGER.error('The benchmark sizes argument is invalid. ' +
+                     'Valid format: 256x256,1024x1024')
+        return
+
+    benchmark_engines = mandelbrot.benchmark.get_available_engines() \
+        if arguments.benchmark_engines is None \
+        else arguments.benchmark_engines.split(',')
+    benchmark_regions = arguments.benchmark_regions.split(',')
+    for engine in benchmark_engines:
+        if engine not in mandelbrot.benchmark.ENGINES:
+            LOGGER.error('Unknown benchmark engine %s, valid engines: %s'
+                         % (engine, ', '.join(mandelbrot.benchmark.ENGINES)))
+            return
+    for region in benchmark_regions:
+        if region not in mandelbrot.benchmark.REGIONS:
+            LOGGER.error('Unknown benchmark region %s, valid regions: %s'
+                         % (region, ', '.join(mandelbrot.benchmark.REGIONS)))
+            return
+
+    try:
+        listen = mandelbrot.distributed.parse_address(arguments.listen)
+        connect = mandelbrot.distributed.parse_address(arguments.connect) \
+            if arguments.connect is not None else None
+    except ValueError as ex:
+        LOGGER.error(ex)
+        return
+
+    if arguments.tile_timeout <= 0:
+        LOGGER.error('The tile timeout has to be positive.')
+        return
+
     tasks = arguments.tasks
     output_file = arguments.output
     quiet_mode = arguments.quiet
     app_mode = arguments.mode
 
     gpu = arguments.gpu if hasattr(arguments, 'gpu') else False
+    numpy = arguments.numpy if hasattr(arguments, 'numpy') else False
+    subdivision = arguments.subdivision \
+        if hasattr(arguments, 'subdivision') else False
+    supersampling = arguments.supersampling \
+        if hasattr(arguments, 'supersampling') else 1
+    adaptive_sampling = arguments.adaptive_sampling \
+        if hasattr(arguments, 'adaptive_sampling') else False
+
+    if supersampling < 1:
+        LOGGER.error('The supersampling argument is invalid. Valid format: 3')
+        return
 
     return {
         'width': width, 'height': height,
         'real_axis_range': real_axis_range,
-        'imag_axis_range': imag_axis_range,
-        'output_file': output_file,
-        'tasks': tasks, 'gpu': gpu,
+        'imag_axis_range': imag_axis_range, 'zoom': zoom,
+        'center': center, 'scale': arguments.scale,
+        'zoom_tolerance': arguments.zoom_tolerance,
+        'max_iterations': max_iterations,
+        'escape_radius': arguments.escape_radius,
+        'color_density': arguments.color_density,
+        'color_scheme': color_scheme,
+        'output_file': output_file, 'band_size': arguments.band_size,
+        'field_file': arguments.save_field,
+        'recolor_field_file': arguments.recolor,
+        'metrics_file': arguments.metrics, 'trace_file': arguments.trace,
+        'profile_file': arguments.profile,
+        'tasks': tasks, 'tile_size': tile_size,
+        'cache_size': arguments.cache_size, 'cache_dir': arguments.cache_dir,
+        'gpu': gpu, 'numpy': numpy, 'subdivision': subdivision,
+        'supersampling': supersampling,
+        'adaptive_sampling': adaptive_sampling,
+        'benchmark_engines': benchmark_engines,
+        'benchmark_tasks': benchmark_tasks,
+        'benchmark_sizes': benchmark_sizes,
+        'benchmark_iterations': benchmark_iterations,
+        'benchmark_regions': benchmark_regions,
+        'benchmark_repeats': arguments.benchmark_repeats,
+        'benchmark_results': arguments.benchmark_results,
+        'benchmark_baseline': arguments.benchmark_baseline,
+        'benchmark_compare': arguments.benchmark_compare,
+        'regression_threshold': arguments.regression_threshold,
+        'listen': listen, 'connect': connect,
+        'tile_timeout': arguments.tile_timeout,
         'app_mode': app_mode, 'quiet_mode': quiet_mode
     }
 
 
 def main():
     arguments = parse_arguments()
+    if arguments is None:
+        sys.exit(1)
+
     quiet_mode = arguments['quiet_mode']
     app_mode = arguments['app_mode']
 
@@ -126,7 +549,20 @@ def main():
                 'No PyQt library exists! Continuing to console mode...')
 
     if app_mode == 1:
-        console.start(arguments)
+        if not console.start(arguments):
+            sys.exit(1)
+
+    if app_mode == 2:
+        if not benchmark.start(arguments):
+            sys.exit(1)
+
+    if app_mode == 3:
+        if not distributed.start(arguments):
+            sys.exit(1)
+
+    if app_mode == 4:
+        if not server.start(arguments):
+            sys.exit(1)
 
 
 if __name__ == '__main__':
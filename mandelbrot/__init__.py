@@ -1,21 +1,176 @@
+import os
 import time
 import logging
 
-from mandelbrot import mandelbrot_cpu, mandelbrot_gpu
+from mandelbrot import (
+    benchmark, constants, distributed, field_file, mandelbrot_cpu,
+    mandelbrot_gpu, mandelbrot_numpy, mandelbrot_perturbation, metrics,
+    png_writer, tile_server, worker_pool)
+from mandelbrot.cancellation import CancellationToken, GenerationCancelled
+from mandelbrot.metrics import Metrics
+from mandelbrot.tile_cache import TileCache, get_tile_cache
 
 LOGGER = logging.getLogger('mandelbrot_visualisation')
 
+# The relative difference below which two views have the same scale and
+# are offset by whole pixels
+PAN_TOLERANCE = 1e-6
+
 
 class Mandelbrot(object):
 
-    def __init__(self):
+    def __init__(self, cache=None, metrics=None):
         self._logger = LOGGER
+        # The stages of every run and the jobs of the workers are recorded
+        # into the metrics, which are sent to their sink after every run
+        self.metrics = metrics
+
+        self._pool = worker_pool.WorkerPool(self._logger)
 
-        self._cpu = mandelbrot_cpu.MandelbrotCPU(self._logger)
+        self._cpu = mandelbrot_cpu.MandelbrotCPU(self._logger, self._pool)
         self._gpu = mandelbrot_gpu.MandelbrotGPU(self._logger)
+        self._numpy = mandelbrot_numpy.MandelbrotNumPy(
+            self._logger, self._pool, cache)
+        self._perturbation = mandelbrot_perturbation.MandelbrotPerturbation(
+            self._logger, self._pool)
+
+        for mandelbrot_instance in [self._cpu, self._numpy,
+                                    self._perturbation]:
+            mandelbrot_instance.set_metrics(metrics)
+
+        # The results and the image of the last generated view, which are
+        # reused when the next view is the same one moved by whole pixels
+        self._view = None
+
+    def close(self):
+        self._release_view()
+        self._pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _stage(self, name):
+        return metrics.stage(self.metrics, name)
+
+    def _clear_metrics(self):
+        # Every run starts its own metrics
+        if self.metrics is not None:
+            self.metrics.clear()
+
+    def _emit_metrics(self):
+        if self.metrics is not None:
+            self.metrics.emit()
+
+    def _get_iteration_limits(self, width, real_axis_range, imag_axis_range,
+                              max_iterations, escape_radius):
+        if max_iterations is None:
+            max_iterations = constants.MAX_ITERATIONS
+        elif max_iterations == 'auto':
+            max_iterations = constants.get_adaptive_iterations(
+                width, complex(real_axis_range[1] - real_axis_range[0],
+                               imag_axis_range[1] - imag_axis_range[0]))
+        if escape_radius is None:
+            escape_radius = constants.ESCAPE_RADIUS
+
+        self._logger.debug(
+            'Iterations: %s, escape radius: %s'
+            % (max_iterations, escape_radius))
+
+        return max_iterations, escape_radius
+
+    def _keep_view(self, view, real_axis_range, imag_axis_range,
+                   results, image):
+        self._release_view()
+        self._view = (view, real_axis_range, imag_axis_range, results, image)
+
+    def _release_view(self):
+        if self._view is not None:
+            view, _, _, results, _ = self._view
+            view[2].release(results)
+            self._view = None
+
+    def _get_view_shift(self, view, real_axis_range, imag_axis_range):
+        # The shift in pixels from the last view, when the new one has the
+        # same size, scale and colouring and only moves by whole pixels
+        if self._view is None or self._view[0] != view:
+            return None
+
+        width, height = view[:2]
+        _, last_real_axis_range, last_imag_axis_range, _, _ = self._view
+
+        shift = []
+        for axis_range, last_axis_range, length in [
+                (real_axis_range, last_real_axis_range, width),
+                (imag_axis_range, last_imag_axis_range, height)]:
+            axis_length = axis_range[1] - axis_range[0]
+            last_axis_length = last_axis_range[1] - last_axis_range[0]
+            if abs(axis_length - last_axis_length) > \
+                    PAN_TOLERANCE * abs(axis_length):
+                return None
+
+            pixels = (axis_range[0] - last_axis_range[0]) * \
+                (length - 1) / axis_length
+            if abs(pixels - round(pixels)) > PAN_TOLERANCE * length or \
+                    abs(pixels) >= length:
+                return None
+            shift.append(int(round(pixels)))
+
+        return tuple(shift)
+
+    def _generate_shifted(self, view, real_axis_range, imag_axis_range,
+                          shift, tasks, tile_size):
+        width, height, mandelbrot_instance = view[:3]
+        color_density, color_scheme = view[5:]
+        _, _, _, last_results, last_image = self._view
+
+        with self._stage('shift'):
+            results, image, regions = mandelbrot_instance.shift(
+                width, height, last_results, last_image, *shift)
+        try:
+            with self._stage('generation'):
+                mandelbrot_instance.generate_regions(
+                    width, height, real_axis_range, imag_axis_range, tasks,
+                    results, regions, tile_size)
+            with self._stage('rendering'):
+                image = mandelbrot_instance.render(
+                    width, height, results, tasks, color_density,
+                    regions, image, color_scheme)
+        except BaseException:
+            mandelbrot_instance.release(results)
+            raise
+
+        self._logger.debug(
+            'View shifted by %s, %s pixels, %s of %s pixels generated'
+            % (shift + (sum(region[2] * region[3] for region in regions),
+                        width * height)))
+
+        self._keep_view(view, real_axis_range, imag_axis_range,
+                        results, image)
+
+        return image
 
     def generate(self, width, height, real_axis_range, imag_axis_range,
-                 tasks=1, gpu_acceleration=False):
+                 tasks=1, gpu_acceleration=False, numpy_acceleration=False,
+                 tile_size=None, subdivision=False, max_iterations=None,
+                 escape_radius=None, color_density=None,
+                 progress=None, cancel=None, field_filename=None,
+                 color_scheme=None, center=None, scale=None,
+                 supersampling=1, adaptive_sampling=False):
+        # With a center and a scale (the width of the real axis) instead of
+        # the axis ranges, the deep zoom generator is used
+        self._clear_metrics()
+        if center is not None:
+            if field_filename is not None:
+                self._logger.error('The iteration field of a deep zoom ' +
+                                   'can not be saved.')
+            return self._generate_deep(
+                width, height, center, scale, tasks, tile_size,
+                max_iterations, escape_radius, color_density, color_scheme,
+                progress, cancel)
+
         self._logger.debug(
             ('Mandelbrot set generation started with arguments:\n' +
              ' width: %s, height: %s\n' +
@@ -24,29 +179,555 @@ class Mandelbrot(object):
 
         self._logger.debug('Processes used in current run: %s' % tasks)
 
+        max_iterations, escape_radius = self._get_iteration_limits(
+            width, real_axis_range, imag_axis_range,
+            max_iterations, escape_radius)
+
+        if supersampling > 1:
+            return self._generate_supersampled(
+                width, height, real_axis_range, imag_axis_range, tasks,
+                numpy_acceleration and not gpu_acceleration and
+                not subdivision, tile_size, max_iterations, escape_radius,
+                color_density, field_filename, color_scheme, supersampling,
+                adaptive_sampling)
+
         gpu_acceleration = True \
             if gpu_acceleration and mandelbrot_gpu.is_gpu_accelerated() \
             else False
 
-        mandelbrot_instance = self._cpu if not gpu_acceleration else self._gpu
+        numpy_acceleration = True \
+            if numpy_acceleration and mandelbrot_numpy.is_numpy_accelerated() \
+            else False
+
+        if gpu_acceleration:
+            mandelbrot_instance = self._gpu
+        elif numpy_acceleration:
+            mandelbrot_instance = self._numpy
+        else:
+            mandelbrot_instance = self._cpu
+
+        if subdivision and mandelbrot_instance is not self._numpy:
+            self._logger.error(
+                'Subdivision is only available with NumPy acceleration.')
+            subdivision = False
+
+        generate = mandelbrot_instance.generate \
+            if not subdivision else self._numpy.generate_subdivision
+
+        begin_time = time.time()
+
+        # Only the CPU backends keep their results for the next view
+        view = (width, height, mandelbrot_instance,
+                max_iterations, escape_radius, color_density, color_scheme)
+        shift = self._get_view_shift(view, real_axis_range, imag_axis_range) \
+            if mandelbrot_instance is not self._gpu else None
+
+        if mandelbrot_instance is not self._gpu:
+            mandelbrot_instance.set_monitor(progress, cancel)
+        try:
+            if shift is not None:
+                image = self._generate_shifted(
+                    view, real_axis_range, imag_axis_range, shift,
+                    tasks, tile_size)
+            else:
+                image = self._generate_view(
+                    view, real_axis_range, imag_axis_range, tasks,
+                    tile_size, generate)
+        finally:
+            if mandelbrot_instance is not self._gpu:
+                mandelbrot_instance.set_monitor()
+
+        if field_filename is not None:
+            if mandelbrot_instance is self._gpu:
+                self._logger.error('The iteration field can not be saved ' +
+                                   'with the GPU acceleration.')
+            else:
+                _, _, _, results, _ = self._view
+                with self._stage('field'), field_file.FieldWriter(
+                        self._logger, field_filename, width, height,
+                        real_axis_range, imag_axis_range,
+                        max_iterations, escape_radius) as writer:
+                    writer.write(results)
+                self._logger.info('Iteration field saved to %s'
+                                  % field_filename)
+
+        if self.metrics is not None and self._view is not None and \
+                mandelbrot_instance is not self._gpu and \
+                mandelbrot_numpy.is_numpy_accelerated():
+            self.metrics.add_tile_iterations(
+                'generation', self._view[3][0], width)
+
+        total_time = time.time() - begin_time
+        self._logger.info('Total run time: %.5fs' % total_time)
+        self._emit_metrics()
+
+        return image
+
+    def _generate_supersampled(self, width, height, real_axis_range,
+                               imag_axis_range, tasks, numpy_acceleration,
+                               tile_size, max_iterations, escape_radius,
+                               color_density, field_filename, color_scheme,
+                               supersampling, adaptive_sampling):
+        if not numpy_acceleration or \
+                not mandelbrot_numpy.is_numpy_accelerated():
+            self._logger.error('Supersampling is only available with ' +
+                               'NumPy acceleration without subdivision.')
+            return
+
+        if field_filename is not None:
+            self._logger.error('The iteration field of a supersampled ' +
+                               'image can not be saved.')
+
+        begin_time = time.time()
+        with self._stage('supersampling'):
+            image = self._numpy.generate_supersampled(
+                width, height, real_axis_range, imag_axis_range, tasks,
+                supersampling, adaptive_sampling, None, tile_size,
+                max_iterations, escape_radius, color_density, color_scheme)
+
+        total_time = time.time() - begin_time
+        self._logger.info('Total run time: %.5fs' % total_time)
+        self._emit_metrics()
+
+        return image
+
+    def _generate_deep(self, width, height, center, scale, tasks, tile_size,
+                       max_iterations, escape_radius, color_density,
+                       color_scheme, progress, cancel):
+        self._logger.debug(
+            ('Mandelbrot set deep zoom generation started with arguments:\n' +
+             ' width: %s, height: %s\n' +
+             ' center: %s, scale: %s')
+            % (width, height, center, scale))
+
+        if not mandelbrot_perturbation.is_perturbation_available():
+            self._logger.error(
+                'The deep zoom is only available with NumPy acceleration.')
+            return
+
+        max_iterations, escape_radius = self._get_iteration_limits(
+            width, [0, scale], [0, scale * (height - 1) / (width - 1)],
+            max_iterations, escape_radius)
 
         begin_time = time.time()
+        self._perturbation.set_monitor(progress, cancel)
+        try:
+            with self._stage('generation'):
+                results = self._perturbation.generate(
+                    width, height, center, scale, tasks, tile_size,
+                    max_iterations, escape_radius)
+        finally:
+            self._perturbation.set_monitor()
+        self._logger.info('Mandelbrot set generated in %.5fs'
+                          % (time.time() - begin_time))
+
+        begin_rendering_time = time.time()
+        try:
+            with self._stage('rendering'):
+                image = self._numpy.render(
+                    width, height, results, tasks, color_density,
+                    color_scheme=color_scheme)
+        finally:
+            self._perturbation.release(results)
+        self._logger.info('Mandelbrot set rendered in %.5fs'
+                          % (time.time() - begin_rendering_time))
+
+        total_time = time.time() - begin_time
+        self._logger.info('Total run time: %.5fs' % total_time)
+        self._emit_metrics()
+
+        return image
+
+    def _generate_view(self, view, real_axis_range, imag_axis_range, tasks,
+                       tile_size, generate):
+        (width, height, mandelbrot_instance,
+         max_iterations, escape_radius, color_density, color_scheme) = view
 
         begin_generation_time = time.time()
-        results = mandelbrot_instance.generate(
-            width, height, real_axis_range, imag_axis_range, tasks)
+        with self._stage('generation'):
+            results = generate(
+                width, height, real_axis_range, imag_axis_range, tasks,
+                tile_size, max_iterations, escape_radius)
         generation_time = time.time() - begin_generation_time
         self._logger.info('Mandelbrot set generated in %.5fs'
                           % generation_time)
 
         begin_rendering_time = time.time()
-        image = mandelbrot_instance.render(
-            width, height, results, tasks)
+        try:
+            with self._stage('rendering'):
+                image = mandelbrot_instance.render(
+                    width, height, results, tasks, color_density,
+                    color_scheme=color_scheme)
+        except BaseException:
+            mandelbrot_instance.release(results)
+            raise
         rendering_time = time.time() - begin_rendering_time
         self._logger.info('Mandelbrot set rendered in %.5fs'
                           % rendering_time)
 
+        if mandelbrot_instance is not self._gpu:
+            self._keep_view(view, real_axis_range, imag_axis_range,
+                            results, image)
+        else:
+            mandelbrot_instance.release(results)
+
+        return image
+
+    def generate_distributed(self, coordinator, width, height,
+                             real_axis_range, imag_axis_range, tasks=1,
+                             numpy_acceleration=False, tile_size=None,
+                             max_iterations=None, escape_radius=None,
+                             color_density=None, color_scheme=None):
+        # The tiles are generated by the workers of the coordinator
+        # (distributed.Coordinator), only the rendering runs here
+        self._clear_metrics()
+        self._logger.debug(
+            ('Mandelbrot set distributed generation started with ' +
+             'arguments:\n' +
+             ' width: %s, height: %s\n' +
+             ' real axis range: %s, imag axis range: %s')
+            % (width, height, real_axis_range, imag_axis_range))
+
+        max_iterations, escape_radius = self._get_iteration_limits(
+            width, real_axis_range, imag_axis_range,
+            max_iterations, escape_radius)
+
+        mandelbrot_instance = self._numpy \
+            if numpy_acceleration and mandelbrot_numpy.is_numpy_accelerated() \
+            else self._cpu
+
+        begin_time = time.time()
+        view = (width, height, mandelbrot_instance,
+                max_iterations, escape_radius, color_density, color_scheme)
+        coordinator.set_metrics(self.metrics)
+        try:
+            image = self._generate_view(
+                view, real_axis_range, imag_axis_range, tasks, tile_size,
+                coordinator.generate)
+        finally:
+            coordinator.set_metrics()
+
         total_time = time.time() - begin_time
         self._logger.info('Total run time: %.5fs' % total_time)
+        self._emit_metrics()
 
         return image
+
+    def generate_bands(self, width, height, real_axis_range, imag_axis_range,
+                       output_file, band_size, tasks=1,
+                       numpy_acceleration=False, tile_size=None,
+                       max_iterations=None, escape_radius=None,
+                       color_density=None, field_filename=None,
+                       color_scheme=None, supersampling=1,
+                       adaptive_sampling=False):
+        # Generates and renders band_size rows at once and appends them to
+        # the PNG output file, so the whole image is never in memory.
+        # Returns the output file once it is saved, None on errors.
+        self._clear_metrics()
+        self._logger.debug(
+            ('Mandelbrot set generation in bands of %s rows started with ' +
+             'arguments:\n width: %s, height: %s\n' +
+             ' real axis range: %s, imag axis range: %s')
+            % (band_size, width, height, real_axis_range, imag_axis_range))
+
+        max_iterations, escape_radius = self._get_iteration_limits(
+            width, real_axis_range, imag_axis_range,
+            max_iterations, escape_radius)
+
+        mandelbrot_instance = self._numpy \
+            if numpy_acceleration and mandelbrot_numpy.is_numpy_accelerated() \
+            else self._cpu
+
+        if supersampling > 1 and mandelbrot_instance is not self._numpy:
+            self._logger.error(
+                'Supersampling is only available with NumPy acceleration.')
+            return
+
+        if supersampling > 1 and field_filename is not None:
+            self._logger.error('The iteration field of a supersampled ' +
+                               'image can not be saved.')
+            field_filename = None
+
+        field_writer = None
+        if field_filename is not None:
+            field_writer = field_file.FieldWriter(
+                self._logger, field_filename, width, height,
+                real_axis_range, imag_axis_range,
+                max_iterations, escape_radius)
+
+        begin_time = time.time()
+        try:
+            with png_writer.PNGWriter(
+                    self._logger, output_file, width, height) as writer:
+                for band_y in range(0, height, band_size):
+                    band = (band_y, min(band_size, height - band_y))
+
+                    if supersampling > 1:
+                        with self._stage('supersampling'):
+                            image = self._numpy.generate_supersampled(
+                                width, height, real_axis_range,
+                                imag_axis_range, tasks, supersampling,
+                                adaptive_sampling, band, tile_size,
+                                max_iterations, escape_radius,
+                                color_density, color_scheme)
+                        with self._stage('writing'):
+                            written = image is not None and \
+                                writer.write(image)
+                    else:
+                        written = self._write_band(
+                            mandelbrot_instance, width, height,
+                            real_axis_range, imag_axis_range, tasks, band,
+                            tile_size, max_iterations, escape_radius,
+                            color_density, color_scheme, writer,
+                            field_writer)
+                    # The writer removes the unfinished image on closing
+                    if not written:
+                        break
+
+                    self._logger.debug('Rows %s of %s written'
+                                       % (band_y + band[1], height))
+        except BaseException:
+            if field_writer is not None:
+                field_writer.abort()
+            raise
+
+        # The field is kept only together with the complete image
+        if writer.rows != height:
+            if field_writer is not None:
+                field_writer.abort()
+            return
+
+        if field_writer is not None:
+            field_writer.close()
+            self._logger.info('Iteration field saved to %s' % field_filename)
+
+        total_time = time.time() - begin_time
+        self._logger.info('Total run time: %.5fs' % total_time)
+        self._emit_metrics()
+
+        return output_file
+
+    def _write_band(self, mandelbrot_instance, width, height,
+                    real_axis_range, imag_axis_range, tasks, band, tile_size,
+                    max_iterations, escape_radius, color_density,
+                    color_scheme, writer, field_writer):
+        # Returns whether the band was written
+        with self._stage('generation'):
+            results = mandelbrot_instance.generate_band(
+                width, height, real_axis_range, imag_axis_range,
+                tasks, band, tile_size, max_iterations, escape_radius)
+        try:
+            with self._stage('rendering'):
+                image = mandelbrot_instance.render(
+                    width, band[1], results, tasks, color_density,
+                    color_scheme=color_scheme)
+            if image is None:
+                return False
+
+            with self._stage('writing'):
+                if not writer.write(image):
+                    return False
+                if field_writer is not None:
+                    field_writer.write(results, band[0])
+        finally:
+            mandelbrot_instance.release(results)
+
+        return True
+
+    def generate_zoom(self, width, height, center, scale_range, frames,
+                      output_file, tasks=1, numpy_acceleration=False,
+                      tile_size=None, max_iterations=None, escape_radius=None,
+                      color_density=None, color_scheme=None,
+                      reuse_tolerance=None, coordinator=None):
+        # Renders the frames of a zoom into the center from the first to
+        # the last width of the real axis in scale_range, every frame is
+        # saved as output_file with the frame number as soon as it is done.
+        # With a reuse tolerance, every frame is seeded from the previous
+        # one, so the frames are generated one after another. With a
+        # coordinator, the frames are generated by its workers.
+        self._clear_metrics()
+        self._logger.debug(
+            ('Mandelbrot set zoom generation started with arguments:\n' +
+             ' width: %s, height: %s\n' +
+             ' center: %s, scale range: %s, frames: %s')
+            % (width, height, center, scale_range, frames))
+
+        mandelbrot_instance = self._numpy \
+            if numpy_acceleration and mandelbrot_numpy.is_numpy_accelerated() \
+            else self._cpu
+
+        if reuse_tolerance is not None and coordinator is not None:
+            self._logger.error('Reusing the previous frames is not ' +
+                               'available with distributed generation.')
+            reuse_tolerance = None
+
+        if reuse_tolerance is not None and \
+                mandelbrot_instance is not self._numpy:
+            self._logger.error('Reusing the previous frames is only ' +
+                               'available with NumPy acceleration.')
+            reuse_tolerance = None
+
+        # The scale changes by the same factor from frame to frame
+        zoom_frames = []
+        for frame in range(frames):
+            real_scale = scale_range[0] * (scale_range[1] / scale_range[0]) \
+                ** (frame / float(max(frames - 1, 1)))
+            imag_scale = real_scale * (height - 1) / float(max(width - 1, 1))
+            real_axis_range = [center.real - real_scale / 2,
+                               center.real + real_scale / 2]
+            imag_axis_range = [center.imag - imag_scale / 2,
+                               center.imag + imag_scale / 2]
+
+            zoom_frames.append((width, height, real_axis_range,
+                                imag_axis_range) + self._get_iteration_limits(
+                                    width, real_axis_range, imag_axis_range,
+                                    max_iterations, escape_radius))
+
+        filename, extension = os.path.splitext(output_file)
+        digits = len(str(frames - 1))
+
+        begin_time = time.time()
+        if coordinator is not None:
+            finished_frames = coordinator.generate_frames(
+                zoom_frames, tasks, tile_size)
+        elif reuse_tolerance is None:
+            finished_frames = mandelbrot_instance.generate_frames(
+                zoom_frames, tasks, tile_size)
+        else:
+            finished_frames = self._generate_resampled_frames(
+                zoom_frames, tasks, tile_size, reuse_tolerance)
+
+        for index, results in finished_frames:
+            try:
+                with self._stage('rendering'):
+                    image = mandelbrot_instance.render(
+                        width, height, results, tasks, color_density,
+                        color_scheme=color_scheme)
+            finally:
+                mandelbrot_instance.release(results)
+
+            frame_file = '%s_%0*d%s' % (filename, digits, index, extension)
+            with self._stage('saving'):
+                image.save(frame_file)
+            self._logger.info('Frame %s of %s saved to %s'
+                              % (index + 1, frames, frame_file))
+
+        total_time = time.time() - begin_time
+        self._logger.info('Total run time: %.5fs' % total_time)
+        self._emit_metrics()
+
+    def _generate_resampled_frames(self, frames, tasks, tile_size, tolerance):
+        previous = None
+        for index, frame in enumerate(frames):
+            (width, height, real_axis_range, imag_axis_range,
+             max_iterations, escape_radius) = frame
+
+            results, previous = self._numpy.generate_resampled(
+                width, height, real_axis_range, imag_axis_range, tasks,
+                previous, tolerance, tile_size, max_iterations, escape_radius)
+
+            yield index, results
+
+    def render_field(self, field_filename, tasks=1, numpy_acceleration=False,
+                     color_density=None, color_scheme=None):
+        # Renders an iteration field saved by generate(), the field is
+        # mapped from the file and is not generated again
+        self._clear_metrics()
+        field = field_file.read_field(self._logger, field_filename)
+        if field is None:
+            return
+
+        header, results = field
+        mandelbrot_instance = self._numpy \
+            if numpy_acceleration and mandelbrot_numpy.is_numpy_accelerated() \
+            else self._cpu
+
+        begin_time = time.time()
+        try:
+            with self._stage('rendering'):
+                image = mandelbrot_instance.render(
+                    header['width'], header['height'], results, tasks,
+                    color_density, color_scheme=color_scheme)
+        finally:
+            mandelbrot_instance.release(results)
+        self._logger.info('Iteration field rendered in %.5fs'
+                          % (time.time() - begin_time))
+        self._emit_metrics()
+
+        return image
+
+    def recolor(self, color_scheme=None, color_density=None, tasks=1):
+        # Renders the last generated view again, e.g. with another color
+        # scheme, without generating it
+        if self._view is None:
+            self._logger.error('No generated view to recolor.')
+            return
+
+        view, _, _, results, _ = self._view
+        width, height, mandelbrot_instance = view[:3]
+
+        begin_time = time.time()
+        image = mandelbrot_instance.render(
+            width, height, results, tasks, color_density,
+            color_scheme=color_scheme)
+        self._logger.info('Mandelbrot set recolored in %.5fs'
+                          % (time.time() - begin_time))
+
+        return image
+
+    def generate_progressive(self, width, height, real_axis_range,
+                             imag_axis_range, tasks=1, tile_size=None,
+                             max_iterations=None, escape_radius=None,
+                             color_density=None, progress=None, cancel=None,
+                             color_scheme=None):
+        # Yields coarse previews first and the full resolution image last,
+        # every pass reuses the pixels of the previous ones
+        if not mandelbrot_numpy.is_numpy_accelerated():
+            yield self.generate(
+                width, height, real_axis_range, imag_axis_range, tasks,
+                tile_size=tile_size, max_iterations=max_iterations,
+                escape_radius=escape_radius, color_density=color_density,
+                progress=progress, cancel=cancel, color_scheme=color_scheme)
+            return
+
+        max_iterations, escape_radius = self._get_iteration_limits(
+            width, real_axis_range, imag_axis_range,
+            max_iterations, escape_radius)
+
+        # A moved view needs no previews, only its new pixels are generated
+        view = (width, height, self._numpy,
+                max_iterations, escape_radius, color_density, color_scheme)
+        shift = self._get_view_shift(view, real_axis_range, imag_axis_range)
+        if shift is not None:
+            self._numpy.set_monitor(progress, cancel)
+            try:
+                image = self._generate_shifted(
+                    view, real_axis_range, imag_axis_range, shift,
+                    tasks, tile_size)
+            finally:
+                self._numpy.set_monitor()
+
+            yield image
+            return
+
+        self._numpy.set_monitor(progress, cancel)
+        passes = self._numpy.generate_progressive(
+            width, height, real_axis_range, imag_axis_range, tasks,
+            tile_size, max_iterations, escape_radius)
+        try:
+            begin_time = time.time()
+            for stride, results in passes:
+                image = self._numpy.render_preview(
+                    width, height, results, stride, color_density,
+                    color_scheme)
+                self._logger.info('Pass 1/%s generated in %.5fs'
+                                  % (stride, time.time() - begin_time))
+
+                yield image
+                begin_time = time.time()
+        finally:
+            passes.close()
+            self._numpy.set_monitor()
+
+        self._keep_view(view, real_axis_range, imag_axis_range,
+                        results, image)
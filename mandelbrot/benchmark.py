@@ -0,0 +1,231 @@
+import csv
+import json
+import time
+import platform
+from collections import OrderedDict
+
+from mandelbrot import (
+    constants, mandelbrot_cpu, mandelbrot_gpu, mandelbrot_numpy, worker_pool)
+
+# The views of the sample images in the screens directory
+REGIONS = OrderedDict([
+    ('full', ([-2.0, 1.0], [-1.5, 1.5])),
+    ('seahorse_valley', ([-0.78, -0.76], [-0.12, -0.10])),
+    ('elephant_valley', ([0.27, 0.28], [0.0, 0.01])),
+    ('mini_mandelbrot', ([-1.79, -1.71], [-0.04, 0.04]))
+])
+
+ENGINES = ('cpu', 'numpy', 'subdivision', 'gpu')
+
+# The fields which tell the same case apart in two runs
+KEY_FIELDS = ('engine', 'region', 'width', 'height', 'max_iterations',
+              'tasks')
+
+RESULT_FIELDS = KEY_FIELDS + (
+    'repeats', 'generation_time', 'rendering_time', 'total_iterations',
+    'pixels_per_second', 'iterations_per_second')
+
+
+def get_available_engines():
+    engines = ['cpu']
+    if mandelbrot_numpy.is_numpy_accelerated():
+        engines += ['numpy', 'subdivision']
+    if mandelbrot_gpu.is_gpu_accelerated():
+        engines.append('gpu')
+
+    return engines
+
+
+def _get_total_iterations(results):
+    iterations = results[0]
+    if hasattr(iterations, 'get'):
+        # The GPU results are copied back from the device
+        return int(iterations.get().sum())
+
+    if mandelbrot_numpy.is_numpy_accelerated():
+        return int(iterations.as_array().sum(dtype='int64'))
+
+    return sum(iterations.values)
+
+
+class Benchmark(object):
+
+    # Generates and renders every combination of the engines, the numbers
+    # of tasks, the sizes, the numbers of iterations and the regions, and
+    # keeps the best of the repeated runs of each of them
+    def __init__(self, logger):
+        self._logger = logger
+
+        self._pool = worker_pool.WorkerPool(self._logger)
+
+        self._cpu = mandelbrot_cpu.MandelbrotCPU(self._logger, self._pool)
+        self._gpu = mandelbrot_gpu.MandelbrotGPU(self._logger)
+        self._numpy = mandelbrot_numpy.MandelbrotNumPy(
+            self._logger, self._pool)
+
+    def close(self):
+        self._pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_engine(self, engine):
+        if engine == 'cpu':
+            return self._cpu, self._cpu.generate
+        if engine == 'numpy':
+            return self._numpy, self._numpy.generate
+        if engine == 'subdivision':
+            return self._numpy, self._numpy.generate_subdivision
+
+        return self._gpu, self._gpu.generate
+
+    def run(self, engines, tasks_counts, sizes, iterations, regions,
+            repeats=3):
+        available_engines = get_available_engines()
+        results = []
+
+        for engine in engines:
+            if engine not in available_engines:
+                self._logger.error('The %s engine is not available.'
+                                   % engine)
+                continue
+
+            mandelbrot_instance, generate = self._get_engine(engine)
+            for tasks in tasks_counts:
+                # The worker pool is started outside of the measurements
+                self._run_case(mandelbrot_instance, generate, tasks, 8, 8,
+                               REGIONS['full'], constants.MAX_ITERATIONS)
+
+                for width, height in sizes:
+                    for max_iterations in iterations:
+                        for region in regions:
+                            result = self._run_repeats(
+                                engine, mandelbrot_instance, generate, tasks,
+                                width, height, max_iterations, region,
+                                repeats)
+                            self._logger.info(
+                                ('%s, %s tasks, %sx%s, %s iterations, %s: ' +
+                                 '%.5fs, %.0f pixels/s, %.0f iterations/s')
+                                % (engine, tasks, width, height,
+                                   max_iterations, region,
+                                   result['generation_time'] +
+                                   result['rendering_time'],
+                                   result['pixels_per_second'],
+                                   result['iterations_per_second']))
+                            results.append(result)
+
+        return results
+
+    def _run_repeats(self, engine, mandelbrot_instance, generate, tasks,
+                     width, height, max_iterations, region, repeats):
+        runs = [self._run_case(mandelbrot_instance, generate, tasks,
+                               width, height, REGIONS[region], max_iterations)
+                for _ in range(repeats)]
+        generation_time, rendering_time, total_iterations = min(
+            runs, key=lambda run: run[0] + run[1])
+
+        return OrderedDict([
+            ('engine', engine), ('region', region),
+            ('width', width), ('height', height),
+            ('max_iterations', max_iterations), ('tasks', tasks),
+            ('repeats', repeats),
+            ('generation_time', generation_time),
+            ('rendering_time', rendering_time),
+            ('total_iterations', total_iterations),
+            ('pixels_per_second', width * height /
+             max(generation_time + rendering_time, 1e-9)),
+            ('iterations_per_second', total_iterations /
+             max(generation_time, 1e-9))
+        ])
+
+    def _run_case(self, mandelbrot_instance, generate, tasks, width, height,
+                  region, max_iterations):
+        real_axis_range, imag_axis_range = region
+
+        begin_time = time.perf_counter()
+        results = generate(width, height, real_axis_range, imag_axis_range,
+                           tasks, None, max_iterations,
+                           constants.ESCAPE_RADIUS)
+        generation_time = time.perf_counter() - begin_time
+
+        try:
+            begin_time = time.perf_counter()
+            mandelbrot_instance.render(width, height, results, tasks)
+            rendering_time = time.perf_counter() - begin_time
+
+            total_iterations = _get_total_iterations(results)
+        finally:
+            mandelbrot_instance.release(results)
+
+        return generation_time, rendering_time, total_iterations
+
+
+def save_results(results, filename):
+    # CSV files get one row per case, JSON files the machine as well
+    if filename.lower().endswith('.csv'):
+        with open(filename, 'w', newline='') as results_file:
+            writer = csv.DictWriter(results_file, RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+        return
+
+    with open(filename, 'w') as results_file:
+        json.dump({
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'python': platform.python_version(),
+            'results': results
+        }, results_file, indent=2)
+
+
+def load_results(logger, filename):
+    try:
+        with open(filename) as results_file:
+            if filename.lower().endswith('.csv'):
+                return [dict((field, _parse_field(field, value))
+                             for field, value in row.items())
+                        for row in csv.DictReader(results_file)]
+
+            return json.load(results_file)['results']
+    except (IOError, OSError, ValueError, KeyError) as ex:
+        logger.error(ex)
+
+
+def _parse_field(field, value):
+    if field in ('engine', 'region'):
+        return value
+    if field in ('width', 'height', 'max_iterations', 'tasks', 'repeats',
+                 'total_iterations'):
+        return int(value)
+
+    return float(value)
+
+
+def compare_results(logger, results, baseline, threshold=0.1):
+    # The cases whose pixels per second dropped by more than the threshold
+    # (a fraction) from the baseline are regressions, they are returned
+    baseline = dict((tuple(result[field] for field in KEY_FIELDS), result)
+                    for result in baseline)
+    regressions = []
+
+    for result in results:
+        key = tuple(result[field] for field in KEY_FIELDS)
+        if key not in baseline:
+            logger.debug('%s has no baseline' % (key,))
+            continue
+
+        change = result['pixels_per_second'] / \
+            baseline[key]['pixels_per_second'] - 1
+        if change < -threshold:
+            regressions.append(result)
+            logger.error('%s: %.0f pixels/s, %+.1f%% from the baseline'
+                         % (key, result['pixels_per_second'], 100 * change))
+        else:
+            logger.info('%s: %.0f pixels/s, %+.1f%% from the baseline'
+                        % (key, result['pixels_per_second'], 100 * change))
+
+    return regressions
@@ -0,0 +1,37 @@
+from mandelbrot.shared_buffer import SharedBuffer
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+class CancellationToken(object):
+
+    # The flag lives in shared memory, so the workers can see it and skip
+    # the tiles which have not started yet
+    def __init__(self):
+        self._flag = SharedBuffer('b', 1)
+        # One view for all the polls, every SharedBuffer.values call keeps
+        # a new one until the buffer is released
+        self._values = self._flag.values
+
+    @property
+    def descriptor(self):
+        return self._flag.descriptor
+
+    def cancel(self):
+        self._values[0] = 1
+
+    def is_cancelled(self):
+        return self._values[0] != 0
+
+    def release(self):
+        if self._flag is not None:
+            self._values = None
+            self._flag.release()
+            self._flag = None
+
+
+def is_cancelled(descriptor):
+    with SharedBuffer.attach(descriptor) as flag:
+        return flag.values[0] != 0
@@ -3,16 +3,33 @@ import json
 import math
 
 MAX_ITERATIONS = 512
+MIN_ADAPTIVE_ITERATIONS = 64
 ESCAPE_RADIUS = 4
-COLOR_DENSITY = int(10 * (MAX_ITERATIONS / 512))
+
+
+def get_color_density(max_iterations):
+    return max(int(10 * (max_iterations / 512.0)), 1)
+
+
+def get_adaptive_iterations(width, dc):
+    # The finer the pixel pitch, the longer the orbits near the border of
+    # the set have to be followed to tell them apart
+    pixels_per_unit = width / abs(dc.real)
+    return max(int(MIN_ADAPTIVE_ITERATIONS *
+                   max(math.log10(pixels_per_unit), 1) ** 1.5),
+               MIN_ADAPTIVE_ITERATIONS)
+
+
+COLOR_DENSITY = get_color_density(MAX_ITERATIONS)
 LOG_ESCAPE_RADIUS = math.log(ESCAPE_RADIUS, 2)
+TILE_SIZE = (256, 64)
 
 RESOURCES_FOLDER = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), '..', 'resources')
 COLOR_SCHEME_FILE = os.path.join(RESOURCES_FOLDER, 'color_scheme.json')
 
 
-def __load_color_scheme(color_scheme):
+def load_color_scheme(color_scheme):
     if not os.path.exists(color_scheme):
         return []
 
@@ -20,5 +37,5 @@ def __load_color_scheme(color_scheme):
         color_scheme = json.load(color_scheme_file)
 
     return color_scheme
-COLOR_SCHEME = __load_color_scheme(COLOR_SCHEME_FILE)
+COLOR_SCHEME = load_color_scheme(COLOR_SCHEME_FILE)
 TOTAL_COLORS = len(COLOR_SCHEME)
@@ -0,0 +1,506 @@
+import os
+import sys
+import json
+import time
+import zlib
+import queue
+import socket
+import struct
+import threading
+import collections
+import multiprocessing
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    pass
+
+from mandelbrot import cancellation, mandelbrot_cpu, mandelbrot_numpy
+from mandelbrot.mandelbrot_cpu import CPUObject
+from mandelbrot.shared_buffer import SharedBuffer
+
+# Every message is the length of its JSON header, the header and the payload
+# of the length given in the header. The tiles are sent as the iteration
+# counts (int32) and the |z| values (float64) of their pixels row by row,
+# little-endian and zlib compressed.
+MAX_HEADER_SIZE = 1 << 16
+
+# A worker which sends neither its tile nor a heartbeat in this many seconds
+# is dropped and the tile is issued to another one. The workers send
+# HEARTBEATS heartbeats per timeout while they compute a tile.
+TILE_TIMEOUT = 60.0
+HEARTBEATS = 4
+
+# A tile which is lost by this many workers fails the run
+MAX_TILE_ATTEMPTS = 3
+
+# The workers retry to connect once a second for this many seconds, so they
+# can be started before the coordinator
+CONNECT_TIMEOUT = 60.0
+
+WAIT_LOG_INTERVAL = 10.0
+
+DEFAULT_ADDRESS = ('127.0.0.1', 7700)
+
+
+class TileFailed(Exception):
+    pass
+
+
+def parse_address(address):
+    # HOST:PORT, the host may be left out for all interfaces
+    host, separator, port = address.rpartition(':')
+    if not separator:
+        raise ValueError(('The address %s has no port. Valid format: ' +
+                          'localhost:7700') % address)
+
+    return host or '0.0.0.0', int(port)
+
+
+def _send_message(connection, header, payload=b''):
+    header = json.dumps(dict(header, payload=len(payload))).encode('utf-8')
+    connection.sendall(struct.pack('<I', len(header)) + header + payload)
+
+
+def _receive_bytes(connection, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(min(size - len(data), 1 << 20))
+        if not chunk:
+            raise ConnectionError('The connection was closed')
+        data += chunk
+
+    return bytes(data)
+
+
+def _receive_message(connection):
+    header_size = struct.unpack('<I', _receive_bytes(connection, 4))[0]
+    if header_size > MAX_HEADER_SIZE:
+        raise ValueError('The message header is %s bytes long' % header_size)
+
+    header = json.loads(
+        _receive_bytes(connection, header_size).decode('utf-8'))
+
+    return header, _receive_bytes(connection, header['payload'])
+
+
+def _get_tile_values(job, numpy_acceleration):
+    # Computes the tile of the job with the same kernels as the local
+    # generators, so the results do not depend on the worker
+    width, height = job['width'], job['height']
+    cmin, dc = complex(*job['cmin']), complex(*job['dc'])
+    max_iterations, escape_radius = job['max_iterations'], job['escape_radius']
+    tile_x, tile_y, tile_width, tile_height = job['tile']
+
+    if numpy_acceleration:
+        x, y = np.meshgrid(np.arange(tile_x, tile_x + tile_width),
+                           np.arange(tile_y, tile_y + tile_height))
+        iterations, z_values = mandelbrot_numpy._get_pixels_iterations(
+            width, height, cmin, dc, x.ravel(), y.ravel(),
+            max_iterations, escape_radius)
+
+        return iterations.astype('<i4').tobytes() + \
+            z_values.astype('<f8').tobytes()
+
+    iterations, z_values = array('i'), array('d')
+    for y in range(tile_y, tile_y + tile_height):
+        for x in range(tile_x, tile_x + tile_width):
+            iteration, z = mandelbrot_cpu._get_pixel_iterations(
+                width, height, cmin, dc, x, y, max_iterations, escape_radius)
+            iterations.append(iteration)
+            z_values.append(z)
+
+    if sys.byteorder == 'big':
+        iterations.byteswap()
+        z_values.byteswap()
+
+    return iterations.tobytes() + z_values.tobytes()
+
+
+def _read_tile_values(header, payload, job_index, tile):
+    _, _, tile_width, tile_height = tile
+    pixels = tile_width * tile_height
+
+    if header.get('type') != 'tile' or header.get('job') != job_index:
+        raise ValueError('Expected tile %s, got %s' % (job_index, header))
+
+    data = zlib.decompressobj().decompress(payload, 12 * pixels + 1)
+    if len(data) != 12 * pixels:
+        raise ValueError('The tile has %s bytes instead of %s'
+                         % (len(data), 12 * pixels))
+
+    iterations, z_values = array('i'), array('d')
+    iterations.frombytes(data[:4 * pixels])
+    z_values.frombytes(data[4 * pixels:])
+    if sys.byteorder == 'big':
+        iterations.byteswap()
+        z_values.byteswap()
+
+    return iterations, z_values
+
+
+def _connect(logger, address):
+    end_time = time.time() + CONNECT_TIMEOUT
+    while True:
+        try:
+            return socket.create_connection(address)
+        except OSError as ex:
+            if time.time() >= end_time:
+                logger.error(('Could not connect to the coordinator at ' +
+                              '%s:%s: %s') % (address + (ex,)))
+                return None
+        time.sleep(1)
+
+
+def _send_heartbeats(connection, interval, stop):
+    while not stop.wait(interval):
+        try:
+            _send_message(connection, {'type': 'heartbeat'})
+        except OSError:
+            return
+
+
+def _compute_tile(connection, job, numpy_acceleration):
+    # The heartbeats tell the coordinator that the worker is still there
+    # while it computes a long tile
+    stop = threading.Event()
+    heartbeat_thread = threading.Thread(
+        target=_send_heartbeats,
+        args=(connection, job['heartbeat'], stop))
+    heartbeat_thread.daemon = True
+    heartbeat_thread.start()
+    try:
+        return _get_tile_values(job, numpy_acceleration)
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+
+
+def run_worker(logger, address, numpy_acceleration=False):
+    # Computes the tiles sent by the coordinator until it stops the worker,
+    # a worker which loses the coordinator connects again
+    numpy_acceleration = numpy_acceleration and \
+        mandelbrot_numpy.is_numpy_accelerated()
+
+    name = '%s:%s' % (socket.gethostname(), os.getpid())
+    tiles = 0
+    while True:
+        connection = _connect(logger, address)
+        if connection is None:
+            return
+
+        with connection:
+            logger.info('Worker %s connected to %s:%s' % ((name,) + address))
+            try:
+                _send_message(connection, {'type': 'hello', 'name': name})
+                while True:
+                    header, _ = _receive_message(connection)
+                    if header['type'] == 'stop':
+                        logger.info('Worker %s stopped after %s tiles'
+                                    % (name, tiles))
+                        return
+
+                    values = _compute_tile(connection, header,
+                                           numpy_acceleration)
+                    _send_message(connection,
+                                  {'type': 'tile', 'job': header['job']},
+                                  zlib.compress(values, 1))
+                    tiles += 1
+            except (OSError, ValueError, KeyError) as ex:
+                logger.error('Worker %s lost the coordinator: %s'
+                             % (name, ex))
+
+
+def start_workers(logger, address, tasks, numpy_acceleration=False):
+    # One connection per task, every one in its own process
+    if tasks <= 1:
+        run_worker(logger, address, numpy_acceleration)
+        return
+
+    processes = [multiprocessing.Process(
+        target=run_worker, args=(logger, address, numpy_acceleration))
+        for _ in range(tasks)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+class Coordinator(CPUObject):
+
+    # Hands out the tiles of the frames to the workers which connect to the
+    # address, one tile at a time to each of them, and collects the results.
+    # The tile of a worker which goes away or falls silent is issued again,
+    # up to MAX_TILE_ATTEMPTS times.
+    def __init__(self, logger, address=DEFAULT_ADDRESS,
+                 tile_timeout=TILE_TIMEOUT):
+        CPUObject.__init__(self, logger)
+        self._tile_timeout = tile_timeout
+        # The tile costs are estimated with NumPy when available
+        self._estimator = mandelbrot_numpy.MandelbrotGeneratorNumPy(logger)
+
+        self._condition = threading.Condition()
+        self._closed = False
+        self._workers = 0
+        self._threads = []
+        # The jobs of the current run, the indexes of those not issued yet,
+        # the times every job was lost and the finished ones as
+        # (run, index, values, timing), with no values for a failed job
+        self._run = 0
+        self._jobs = None
+        self._pending = collections.deque()
+        self._attempts = collections.Counter()
+        self._results = queue.Queue()
+
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self._server.bind(address)
+            self._server.listen(socket.SOMAXCONN)
+        except OSError:
+            self._server.close()
+            raise
+        self.address = self._server.getsockname()[:2]
+
+        self._accept_thread = threading.Thread(target=self._accept_workers)
+        self._accept_thread.daemon = True
+        self._accept_thread.start()
+        self._logger.info('Waiting for workers on %s:%s' % self.address)
+
+    @property
+    def workers(self):
+        return self._workers
+
+    def close(self):
+        # The idle workers are told to stop before the coordinator goes
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._server.close()
+        for thread in self._threads:
+            thread.join(1.0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _accept_workers(self):
+        while True:
+            try:
+                connection, address = self._server.accept()
+            except OSError:
+                return
+
+            thread = threading.Thread(target=self._serve_worker,
+                                      args=(connection, address))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _serve_worker(self, connection, address):
+        name = '%s:%s' % address[:2]
+        connection.settimeout(self._tile_timeout)
+        try:
+            header, _ = _receive_message(connection)
+            if header.get('type') != 'hello':
+                raise ValueError('Expected a hello, got %s' % header)
+            name = header.get('name', name)
+        except (OSError, ValueError, KeyError) as ex:
+            self._logger.error('Worker %s rejected: %s' % (name, ex))
+            connection.close()
+            return
+
+        with self._condition:
+            self._workers += 1
+        self._logger.info('Worker %s connected, %s workers'
+                          % (name, self._workers))
+        try:
+            self._serve_jobs(connection, name)
+        finally:
+            with self._condition:
+                self._workers -= 1
+            connection.close()
+
+    def _serve_jobs(self, connection, name):
+        while True:
+            with self._condition:
+                while not self._closed and not self._pending:
+                    self._condition.wait()
+                if self._closed:
+                    break
+
+                run, job_index = self._run, self._pending.popleft()
+                job = self._jobs[job_index]
+
+            begin_time = time.time()
+            try:
+                _send_message(connection, dict(
+                    job, type='tile', job=job_index,
+                    heartbeat=self._tile_timeout / HEARTBEATS))
+                header, payload = _receive_message(connection)
+                while header.get('type') == 'heartbeat':
+                    header, payload = _receive_message(connection)
+                values = _read_tile_values(header, payload, job_index,
+                                           job['tile'])
+            except (OSError, ValueError, KeyError, zlib.error) as ex:
+                self._logger.error('Worker %s lost tile %s: %s'
+                                   % (name, job_index, ex))
+                with self._condition:
+                    if run != self._run:
+                        return
+                    self._attempts[job_index] += 1
+                    if self._attempts[job_index] < MAX_TILE_ATTEMPTS:
+                        self._pending.appendleft(job_index)
+                        self._condition.notify_all()
+                        return
+                self._results.put((run, job_index, None, None))
+                return
+
+            self._results.put((run, job_index, values,
+                               (name, begin_time, time.time(), None)))
+
+        try:
+            _send_message(connection, {'type': 'stop'})
+        except OSError:
+            pass
+
+    def _run_jobs(self, jobs):
+        # Yields the index and the values of every job as soon as a worker
+        # returned it
+        cancel, progress = self._cancel, self._progress
+        with self._condition:
+            self._run += 1
+            run = self._run
+            self._jobs = jobs
+            self._pending.extend(range(len(jobs)))
+            self._condition.notify_all()
+
+        begin_time = time.time()
+        log_time = begin_time
+        finished = set()
+        try:
+            while len(finished) < len(jobs):
+                if cancel is not None and cancel.is_cancelled():
+                    raise cancellation.GenerationCancelled()
+
+                try:
+                    result_run, job_index, values, timing = \
+                        self._results.get(timeout=1.0)
+                except queue.Empty:
+                    if not self._workers and \
+                            time.time() - log_time >= WAIT_LOG_INTERVAL:
+                        log_time = time.time()
+                        self._logger.info(
+                            'No workers, %s of %s tiles left'
+                            % (len(jobs) - len(finished), len(jobs)))
+                    continue
+
+                if result_run != run or job_index in finished:
+                    continue
+                if values is None:
+                    raise TileFailed(
+                        'The tile %s was lost by %s workers'
+                        % (tuple(jobs[job_index]['tile']), MAX_TILE_ATTEMPTS))
+
+                finished.add(job_index)
+                if self._metrics is not None:
+                    self._metrics.add_job('distributed_tile',
+                                          tuple(jobs[job_index]['tile']),
+                                          timing)
+                if progress is not None:
+                    progress(len(finished), len(jobs))
+
+                yield job_index, values
+        finally:
+            with self._condition:
+                self._run += 1
+                self._jobs = None
+                self._pending.clear()
+                self._attempts.clear()
+            if self._metrics is not None:
+                self._metrics.add_map(begin_time, time.time(),
+                                      max(self._workers, 1))
+
+    def _get_probe_costs(self, width, height, cmin, dc, x, y,
+                         max_iterations, escape_radius):
+        return self._estimator._get_probe_costs(
+            width, height, cmin, dc, x, y, max_iterations, escape_radius)
+
+    def generate(self, width, height, real_axis_range, imag_axis_range,
+                 tasks=None, tile_size=None, max_iterations=None,
+                 escape_radius=None):
+        # The number of tasks is that of the connected workers, the
+        # argument is only there to match the local generators
+        frames = [(width, height, real_axis_range, imag_axis_range,
+                   max_iterations, escape_radius)]
+        for _, results in self.generate_frames(frames, tasks, tile_size):
+            return results
+
+    def generate_frames(self, frames, tasks=None, tile_size=None,
+                        frames_in_flight=4):
+        # As CPUObject._generate_frames: the tiles of several frames share
+        # the workers, the most expensive ones first, and a frame is yielded
+        # with its index once all of its tiles are back
+        for first_frame in range(0, len(frames), frames_in_flight):
+            window = range(first_frame,
+                           min(first_frame + frames_in_flight, len(frames)))
+            frame_results, pending_tiles = {}, {}
+            try:
+                jobs, job_frames, job_costs = [], [], []
+                for index in window:
+                    (width, height, real_axis_range, imag_axis_range,
+                     max_iterations, escape_radius) = frames[index]
+                    cmin = complex(real_axis_range[0], imag_axis_range[0])
+                    cmax = complex(real_axis_range[1], imag_axis_range[1])
+                    dc = cmax - cmin
+
+                    iterations = SharedBuffer('i', width * height)
+                    z_values = SharedBuffer('d', width * height)
+                    frame_results[index] = (iterations, z_values, abs(dc),
+                                            max_iterations, escape_radius)
+
+                    tiles = self._split_tiles(width, height, tile_size)
+                    for tile in tiles:
+                        jobs.append({
+                            'width': width, 'height': height,
+                            'cmin': [cmin.real, cmin.imag],
+                            'dc': [dc.real, dc.imag],
+                            'max_iterations': max_iterations,
+                            'escape_radius': escape_radius,
+                            'tile': list(tile)
+                        })
+                        job_frames.append(index)
+                    job_costs += self._get_tile_costs(
+                        width, height, cmin, dc, tiles,
+                        max_iterations, escape_radius)
+                    pending_tiles[index] = len(tiles)
+
+                order = sorted(range(len(jobs)),
+                               key=lambda job: -job_costs[job])
+
+                for job, values in self._run_jobs(
+                        [jobs[job] for job in order]):
+                    index = job_frames[order[job]]
+                    self._write_tile(frame_results[index], frames[index][0],
+                                     jobs[order[job]]['tile'], values)
+                    pending_tiles[index] -= 1
+                    if not pending_tiles[index]:
+                        yield index, frame_results.pop(index)
+            finally:
+                for results in frame_results.values():
+                    self.release(results)
+
+    def _write_tile(self, results, width, tile, values):
+        tile_x, tile_y, tile_width, tile_height = tile
+        # The rows are copied into the frame, no view of it is kept per tile
+        tile_iterations, tile_z_values = values
+        for row in range(tile_height):
+            begin = (tile_y + row) * width + tile_x
+            tile_begin = row * tile_width
+            results[0].write(
+                begin, tile_iterations[tile_begin:tile_begin + tile_width])
+            results[1].write(
+                begin, tile_z_values[tile_begin:tile_begin + tile_width])
@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import struct
+
+from mandelbrot.shared_buffer import FileBuffer
+
+# The file starts with the magic and the length of the JSON header, the
+# iteration counts (int32) and the |z| values (float64) of the pixels
+# follow row by row at the offsets given in the header
+FIELD_MAGIC = b'MBFIELD1'
+FIELD_ALIGNMENT = 64
+
+
+def _align(offset):
+    return offset + (-offset % FIELD_ALIGNMENT)
+
+
+class FieldWriter(object):
+
+    # The file is allocated at its full size first, so the rows can be
+    # written in any order, e.g. band by band. It is written next to the
+    # final name first and only renamed to it once it is closed.
+    def __init__(self, logger, filename, width, height, real_axis_range,
+                 imag_axis_range, max_iterations, escape_radius):
+        self._logger = logger
+        self.width = width
+        self.height = height
+
+        header = {
+            'width': width, 'height': height,
+            'real_axis_range': list(real_axis_range),
+            'imag_axis_range': list(imag_axis_range),
+            'max_iterations': max_iterations,
+            'escape_radius': escape_radius,
+            'byteorder': sys.byteorder
+        }
+        # The offsets are part of the header, so room for them is reserved
+        # with placeholders at least as long as any offset
+        header_size = len(json.dumps(dict(
+            header, iterations_offset=' ' * 20, z_values_offset=' ' * 20)))
+        self._iterations_offset = _align(
+            len(FIELD_MAGIC) + 4 + header_size)
+        self._z_values_offset = _align(
+            self._iterations_offset + 4 * width * height)
+        header = json.dumps(dict(
+            header, iterations_offset=self._iterations_offset,
+            z_values_offset=self._z_values_offset)).encode('utf-8')
+
+        self._filename = filename
+        self._temporary_filename = '%s.%s.tmp' % (filename, os.getpid())
+        self._file = open(self._temporary_filename, 'wb')
+        self._file.write(FIELD_MAGIC + struct.pack('<I', len(header)))
+        self._file.write(header)
+        self._file.truncate(self._z_values_offset + 8 * width * height)
+
+    def write(self, results, row=0):
+        # The results hold whole rows, starting from the given row
+        iterations, z_values = results[:2]
+
+        self._file.seek(self._iterations_offset + 4 * self.width * row)
+        self._file.write(iterations.values)
+        self._file.seek(self._z_values_offset + 8 * self.width * row)
+        self._file.write(z_values.values)
+
+    def close(self):
+        if self._file is None:
+            return
+
+        self._file.close()
+        self._file = None
+        os.replace(self._temporary_filename, self._filename)
+
+    def abort(self):
+        # The unfinished field is removed, the output path is left as it was
+        if self._file is None:
+            return
+
+        self._file.close()
+        self._file = None
+        os.remove(self._temporary_filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def read_field(logger, filename):
+    # Returns the header and the results for the renderers, the arrays
+    # are mapped from the file and have to be released after use
+    try:
+        with open(filename, 'rb') as field_file:
+            if field_file.read(len(FIELD_MAGIC)) != FIELD_MAGIC:
+                logger.error('%s is not an iteration field file.' % filename)
+                return
+
+            header_size = struct.unpack('<I', field_file.read(4))[0]
+            header = json.loads(field_file.read(header_size).decode('utf-8'))
+            file_size = os.fstat(field_file.fileno()).st_size
+
+        if header['byteorder'] != sys.byteorder:
+            logger.error(('The iteration field was written on a %s-endian ' +
+                          'machine.') % header['byteorder'])
+            return
+
+        width, height = header['width'], header['height']
+        dc = complex(
+            header['real_axis_range'][1] - header['real_axis_range'][0],
+            header['imag_axis_range'][1] - header['imag_axis_range'][0])
+        iterations_offset = header['iterations_offset']
+        z_values_offset = header['z_values_offset']
+        limits = (header['max_iterations'], header['escape_radius'])
+
+        # A truncated file would fail only once the arrays are mapped
+        if width <= 0 or height <= 0 or \
+                file_size < iterations_offset + 4 * width * height or \
+                file_size < z_values_offset + 8 * width * height:
+            logger.error('%s is not a complete iteration field file.'
+                         % filename)
+            return
+    except (IOError, OSError, ValueError, struct.error, KeyError,
+            IndexError, TypeError) as ex:
+        logger.error('The iteration field file %s can not be read: %s'
+                     % (filename, ex))
+        return
+
+    results = (
+        FileBuffer(filename, 'i', width * height, iterations_offset),
+        FileBuffer(filename, 'd', width * height, z_values_offset),
+        abs(dc)) + limits
+
+    return header, results
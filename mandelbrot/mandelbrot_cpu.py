@@ -1,105 +1,619 @@
+import os
+import sys
+import math
+import time
 import cmath
-import multiprocessing
+import queue
+import pickle
+from array import array
 from PIL import Image
 
-from mandelbrot import constants
+from mandelbrot import cancellation, constants, metrics
+from mandelbrot.shared_buffer import SharedBuffer
+from mandelbrot.worker_pool import WorkerPool
+
+# The packed colors are 0x00BBGGRR integers
+RAW_COLOR_MODE = 'RGBX' if sys.byteorder == 'little' else 'XBGR'
+
+# The cost of a tile is estimated from a grid of up to this many pixels per
+# side, with at most one of them for every COST_PIXELS pixels of the tile
+COST_PROBES = 4
+COST_PIXELS = 64
+
+
+def _run_job(args):
+    index, func, cancel, data = args
+
+    if cancel is not None and cancellation.is_cancelled(cancel):
+        return index, None
+
+    return index, func(data)
+
+
+def _run_timed_job(args):
+    # The job is run together with the worker which ran it, its begin and
+    # end time and the peak memory of the worker
+    begin_time = time.time()
+    index, result = _run_job(args)
+
+    return index, result, (os.getpid(), begin_time, time.time(),
+                           metrics.get_peak_memory())
+
+
+def _split_axis(length, tile_length, origin):
+    borders = sorted(set(
+        [0] + list(range(-origin % tile_length, length, tile_length)))) + \
+        [length]
+
+    return [(begin, end - begin) for begin, end in zip(borders, borders[1:])]
 
 
 class CPUObject(object):
 
-    def __init__(self, logger):
+    def __init__(self, logger, pool=None):
         self._logger = logger
-
-    def _parallelize(self, tasks, func, data):
-        try:
-            with multiprocessing.Pool(tasks) as pool:
-                results = pool.map(func, data)
-        except AttributeError:
-            # Python 2 support
-            pool = multiprocessing.Pool(tasks)
-            results = pool.map(func, data)
-            pool.close()
-            pool.join()
+        self._pool = pool
+        self._progress = None
+        self._cancel = None
+        self._metrics = None
+
+    def set_monitor(self, progress=None, cancel=None):
+        # progress(done, total) is called after every job of a stage,
+        # a cancelled token stops the jobs which have not started yet
+        self._progress = progress
+        self._cancel = cancel
+
+    def set_metrics(self, metrics=None):
+        # Every job run by the workers is timed into the metrics
+        self._metrics = metrics
+
+    def _parallelize(self, tasks, func, data, tiles=None):
+        # The jobs are handed out one at a time to the workers which are
+        # free, instead of in fixed chunks, so a worker stuck with an
+        # expensive tile does not hold back the ones queued behind it.
+        # The tiles of the jobs, if given, are recorded into the metrics.
+        progress = self._progress
+
+        results = [None] * len(data)
+        for done, (index, result) in enumerate(
+                self._parallelize_unordered(tasks, func, data, tiles), 1):
+            results[index] = result
+            if progress is not None:
+                progress(done, len(data))
 
         return results
 
+    def _parallelize_unordered(self, tasks, func, data, tiles=None):
+        # Yields the index and the result of every job as soon as it is
+        # finished
+        cancel = self._cancel
+        if cancel is not None and cancel.is_cancelled():
+            raise cancellation.GenerationCancelled()
 
-def _get_pixel_iterations(args):
-    width, height, cmin, dc, x, y = args
+        pool = self._pool if self._pool is not None \
+            else WorkerPool(self._logger)
+        cancel_descriptor = cancel.descriptor if cancel is not None else None
+
+        jobs = [(index, func, cancel_descriptor, job_data)
+                for index, job_data in enumerate(data)]
+        try:
+            if self._metrics is None:
+                for index, result in pool.imap_unordered(
+                        tasks, _run_job, jobs):
+                    yield index, result
+            else:
+                for index, result in self._run_timed_jobs(
+                        pool, tasks, func, jobs, tiles):
+                    yield index, result
+        finally:
+            if pool is not self._pool:
+                pool.close()
+
+        if cancel is not None and cancel.is_cancelled():
+            raise cancellation.GenerationCancelled()
+
+    def _run_timed_jobs(self, pool, tasks, func, jobs, tiles):
+        metrics = self._metrics
+        if pool.tasks != tasks:
+            with metrics.stage('pool_start'):
+                pool.resize(tasks)
+
+        # The jobs of a map have the same arguments but the tile, so the
+        # bytes sent are estimated from the first one alone
+        if jobs:
+            metrics.count('job_bytes',
+                          len(pickle.dumps(jobs[0])) * len(jobs))
+        metrics.count('jobs', len(jobs))
+
+        begin_time = time.time()
+        try:
+            for index, result, timing in pool.imap_unordered(
+                    tasks, _run_timed_job, jobs):
+                metrics.add_job(func.__name__,
+                                tiles[index] if tiles else None, timing)
+                yield index, result
+        finally:
+            metrics.add_map(begin_time, time.time(), tasks)
+
+    def _parallelize_bounded(self, tasks, func, data, tiles=None):
+        # As _parallelize_unordered, but only one job more than the tasks
+        # is queued on the pool at any time, so the jobs the caller queues
+        # between two results (e.g. rendering a finished frame) run next
+        # instead of after all the remaining ones
+        cancel = self._cancel
+        if cancel is not None and cancel.is_cancelled():
+            raise cancellation.GenerationCancelled()
+
+        pool = self._pool if self._pool is not None \
+            else WorkerPool(self._logger)
+        cancel_descriptor = cancel.descriptor if cancel is not None else None
+        metrics = self._metrics
+        run_job = _run_job if metrics is None else _run_timed_job
+
+        # The results and the exceptions of the jobs, in any order
+        results = queue.Queue()
+        next_job, running = 0, 0
+        begin_time = time.time()
+        try:
+            while next_job < len(data) or running:
+                while next_job < len(data) and running <= tasks:
+                    pool.apply_async(
+                        tasks, run_job,
+                        (next_job, func, cancel_descriptor, data[next_job]),
+                        results.put, results.put)
+                    next_job += 1
+                    running += 1
+
+                result = results.get()
+                running -= 1
+                if isinstance(result, BaseException):
+                    raise result
+
+                if metrics is not None:
+                    index, result, timing = result
+                    metrics.add_job(func.__name__,
+                                    tiles[index] if tiles else None, timing)
+                else:
+                    index, result = result
+                yield index, result
+        finally:
+            if metrics is not None:
+                metrics.add_map(begin_time, time.time(), tasks)
+            if pool is not self._pool:
+                pool.close()
+
+        if cancel is not None and cancel.is_cancelled():
+            raise cancellation.GenerationCancelled()
+
+    def _get_probe_costs(self, width, height, cmin, dc, x, y,
+                         max_iterations, escape_radius):
+        return [_get_pixel_cost(width, height, cmin, dc, pixel_x, pixel_y,
+                                max_iterations, escape_radius)
+                for pixel_x, pixel_y in zip(x, y)]
+
+    def _get_tile_costs(self, width, height, cmin, dc, tiles,
+                        max_iterations, escape_radius):
+        # The mean cost of a grid of the pixels of every tile times its area.
+        # The grid is smaller for the small tiles, whose probes would
+        # otherwise be a large share of the pixels iterated in the main
+        # process.
+        x, y, offsets = [], [], [0]
+        for tile_x, tile_y, tile_width, tile_height in tiles:
+            probes = max(1, min(COST_PROBES, int(math.sqrt(
+                tile_width * tile_height // COST_PIXELS))))
+            for probe_y in range(probes):
+                for probe_x in range(probes):
+                    x.append(tile_x + (2 * probe_x + 1) * tile_width //
+                             (2 * probes))
+                    y.append(tile_y + (2 * probe_y + 1) * tile_height //
+                             (2 * probes))
+            offsets.append(len(x))
+
+        costs = self._get_probe_costs(width, height, cmin, dc, x, y,
+                                      max_iterations, escape_radius)
+
+        return [sum(costs[offsets[index]:offsets[index + 1]]) *
+                tile_width * tile_height /
+                float(offsets[index + 1] - offsets[index])
+                for index, (_, _, tile_width, tile_height) in enumerate(tiles)]
+
+    def _sort_tiles(self, width, height, cmin, dc, tiles, max_iterations,
+                    escape_radius):
+        # The most expensive tiles go first and the cheap ones fill the gaps
+        # between the workers at the end
+        costs = self._get_tile_costs(width, height, cmin, dc, tiles,
+                                     max_iterations, escape_radius)
+        order = sorted(range(len(tiles)), key=lambda index: -costs[index])
+
+        return [tiles[index] for index in order]
+
+    def _split_tiles(self, width, height, tile_size=None, origin=(0, 0)):
+        # The tile borders are placed on the multiples of the tile size
+        # counted from origin, the position of the first pixel on a larger
+        # grid of pixels
+        tile_width, tile_height = tile_size or constants.TILE_SIZE
+        tile_width = tile_width or width
+        tile_height = tile_height or height
+
+        return [(x, y, tile_columns, tile_rows)
+                for y, tile_rows in _split_axis(height, tile_height, origin[1])
+                for x, tile_columns in _split_axis(
+                    width, tile_width, origin[0])]
+
+    def _split_regions(self, width, height, regions=None, tile_size=None):
+        if regions is None:
+            regions = [(0, 0, width, height)]
+
+        return [(region_x + tile_x, region_y + tile_y, tile_width, tile_height)
+                for region_x, region_y, region_width, region_height in regions
+                for tile_x, tile_y, tile_width, tile_height in
+                self._split_tiles(region_width, region_height, tile_size)]
+
+    def _paste_regions(self, frame, regions=None, image=None):
+        if image is None:
+            return frame
+
+        for region_x, region_y, region_width, region_height in regions:
+            box = (region_x, region_y,
+                   region_x + region_width, region_y + region_height)
+            image.paste(frame.crop(box), box)
+
+        return image
+
+    def shift(self, width, height, results, image, shift_x, shift_y):
+        # Copies the results and the image into new ones, in which the pixel
+        # (x, y) is the pixel (x + shift_x, y + shift_y) of the old ones.
+        # The regions of the new ones with no old pixels are returned too.
+        iterations = SharedBuffer('i', width * height)
+        z_values = SharedBuffer('d', width * height)
+        shifted_results = (iterations, z_values) + tuple(results[2:])
+
+        left, right = max(-shift_x, 0), min(width - shift_x, width)
+        top, bottom = max(-shift_y, 0), min(height - shift_y, height)
+
+        iterations_values, z_values_values = \
+            iterations.values, z_values.values
+        old_iterations_values, old_z_values_values = \
+            results[0].values, results[1].values
+        for y in range(top, bottom):
+            begin = y * width + left
+            end = begin + right - left
+            offset = shift_y * width + shift_x
+            iterations_values[begin:end] = \
+                old_iterations_values[begin + offset:end + offset]
+            z_values_values[begin:end] = \
+                old_z_values_values[begin + offset:end + offset]
+
+        shifted_image = Image.new('RGB', (width, height))
+        shifted_image.paste(image, (-shift_x, -shift_y))
+
+        regions = [(0, 0, width, top),
+                   (0, bottom, width, height - bottom),
+                   (0, top, left, bottom - top),
+                   (right, top, width - right, bottom - top)]
+        regions = [region for region in regions if region[2] and region[3]]
+
+        return shifted_results, shifted_image, regions
+
+    def _generate_frames(self, tile_func, frames, tasks, tile_size=None):
+        # The tiles of several frames share the workers, so the frames
+        # which are cheap to generate fill the gaps left by the expensive
+        # ones. The most expensive tiles by their estimated cost go
+        # first. A frame is yielded with its index once all of its tiles
+        # are finished, after that its results belong to the caller. The
+        # tiles are queued a few at a time, so the jobs the caller queues
+        # for a finished frame run before the rest of the tiles.
+        frames_in_flight = max(2 * tasks, 4)
+
+        for first_frame in range(0, len(frames), frames_in_flight):
+            window = range(first_frame,
+                           min(first_frame + frames_in_flight, len(frames)))
+            frame_results, pending_tiles = {}, {}
+            try:
+                tile_jobs, job_tiles, tile_frames, tile_costs = \
+                    [], [], [], []
+                for index in window:
+                    (width, height, real_axis_range, imag_axis_range,
+                     max_iterations, escape_radius) = frames[index]
+                    cmin = complex(real_axis_range[0], imag_axis_range[0])
+                    cmax = complex(real_axis_range[1], imag_axis_range[1])
+                    dc = cmax - cmin
+
+                    iterations = SharedBuffer('i', width * height)
+                    z_values = SharedBuffer('d', width * height)
+                    frame_results[index] = (iterations, z_values, abs(dc),
+                                            max_iterations, escape_radius)
+
+                    tiles = self._split_tiles(width, height, tile_size)
+                    for tile in tiles:
+                        tile_jobs.append((
+                            width, height, cmin, dc,
+                            max_iterations, escape_radius, tile,
+                            iterations.descriptor, z_values.descriptor, 0))
+                        job_tiles.append(tile)
+                        tile_frames.append(index)
+                    tile_costs += self._get_tile_costs(
+                        width, height, cmin, dc, tiles,
+                        max_iterations, escape_radius)
+                    pending_tiles[index] = len(tiles)
+
+                order = sorted(range(len(tile_jobs)),
+                               key=lambda job: -tile_costs[job])
+
+                for job, _ in self._parallelize_bounded(
+                        tasks, tile_func, [tile_jobs[job] for job in order],
+                        [job_tiles[job] for job in order]):
+                    index = tile_frames[order[job]]
+                    pending_tiles[index] -= 1
+                    if not pending_tiles[index]:
+                        yield index, frame_results.pop(index)
+            finally:
+                for results in frame_results.values():
+                    self.release(results)
+
+    def release(self, results):
+        iterations, z_values = results[:2]
+        iterations.release()
+        z_values.release()
+
+
+def _is_in_main_bulbs(c):
+    # The main cardioid and the period-2 bulb are inside the set
+    q = (c.real - 0.25) ** 2 + c.imag ** 2
+    if q * (q + (c.real - 0.25)) < 0.25 * c.imag ** 2:
+        return True
+
+    return (c.real + 1) ** 2 + c.imag ** 2 < 0.0625
+
+
+def _get_pixel_iterations(width, height, cmin, dc, x, y,
+                          max_iterations, escape_radius):
 
     fx, fy = x / float(width - 1), y / float(height - 1)
 
     z = c = cmin + complex(fx * dc.real, fy * dc.imag)
 
+    # The |z| of the points which never escape is not used for colouring,
+    # so it is not iterated to the end for them
+    if _is_in_main_bulbs(c):
+        return max_iterations, abs(z)
+
     iteration = 0
-    while iteration < constants.MAX_ITERATIONS and \
-            abs(z) < constants.ESCAPE_RADIUS:
+    saved_z, period_check = z, 1
+    while iteration < max_iterations and abs(z) < escape_radius:
         z = z * z + c
         iteration += 1
 
-    return iteration, abs(z), abs(dc)
+        # Brent's cycle detection: an orbit which returns exactly to an
+        # earlier value repeats forever and never escapes
+        if z == saved_z:
+            return max_iterations, abs(z)
+
+        if iteration == period_check:
+            saved_z, period_check = z, period_check * 2
+
+    return iteration, abs(z)
+
+
+def _get_pixel_cost(width, height, cmin, dc, x, y,
+                    max_iterations, escape_radius):
+    # The number of iterations the pixel takes, the main bulbs take none
+    fx, fy = x / float(width - 1), y / float(height - 1)
+    if _is_in_main_bulbs(cmin + complex(fx * dc.real, fy * dc.imag)):
+        return 1
+
+    return _get_pixel_iterations(width, height, cmin, dc, x, y,
+                                 max_iterations, escape_radius)[0] + 1
+
+
+def _get_tile_iterations(args):
+    # The first row of the buffers is the row_offset-th row of the frame
+    (width, height, cmin, dc, max_iterations, escape_radius,
+     tile, iterations, z_values, row_offset) = args
+    tile_x, tile_y, tile_width, tile_height = tile
+
+    with SharedBuffer.attach(iterations) as iterations, \
+            SharedBuffer.attach(z_values) as z_values:
+        iterations_values = iterations.values
+        z_values_values = z_values.values
+
+        for y in range(tile_y, tile_y + tile_height):
+            row_iterations, row_z_values = array('i'), array('d')
+            for x in range(tile_x, tile_x + tile_width):
+                iteration, z = _get_pixel_iterations(
+                    width, height, cmin, dc, x, y,
+                    max_iterations, escape_radius)
+                row_iterations.append(iteration)
+                row_z_values.append(z)
+
+            begin = (y - row_offset) * width + tile_x
+            iterations_values[begin:begin + tile_width] = row_iterations
+            z_values_values[begin:begin + tile_width] = row_z_values
 
 
 class MandelbrotGeneratorCPU(CPUObject):
 
-    def __init__(self, logger):
-        CPUObject.__init__(self, logger)
+    def __init__(self, logger, pool=None):
+        CPUObject.__init__(self, logger, pool)
+
+    def generate(self, width, height, real_axis_range, imag_axis_range, tasks,
+                 tile_size=None, max_iterations=constants.MAX_ITERATIONS,
+                 escape_radius=constants.ESCAPE_RADIUS):
+        cmin = complex(real_axis_range[0], imag_axis_range[0])
+        cmax = complex(real_axis_range[1], imag_axis_range[1])
+        dc = cmax - cmin
+
+        iterations = SharedBuffer('i', width * height)
+        z_values = SharedBuffer('d', width * height)
+        results = (iterations, z_values, abs(dc),
+                   max_iterations, escape_radius)
+
+        tiles = self._sort_tiles(
+            width, height, cmin, dc,
+            self._split_tiles(width, height, tile_size),
+            max_iterations, escape_radius)
+        tile_jobs = [(width, height, cmin, dc, max_iterations, escape_radius,
+                      tile, iterations.descriptor, z_values.descriptor, 0)
+                     for tile in tiles]
+        try:
+            self._parallelize(tasks, _get_tile_iterations, tile_jobs, tiles)
+        except BaseException:
+            self.release(results)
+            raise
+
+        return results
 
-    def generate(self, width, height, real_axis_range, imag_axis_range, tasks):
+    def generate_regions(self, width, height, real_axis_range,
+                         imag_axis_range, tasks, results, regions,
+                         tile_size=None):
+        # Computes only the given regions of the frame into the results
         cmin = complex(real_axis_range[0], imag_axis_range[0])
         cmax = complex(real_axis_range[1], imag_axis_range[1])
         dc = cmax - cmin
 
-        pixel_jobs = [(width, height, cmin, dc, x, y)
-                      for y in range(height)
-                      for x in range(width)]
+        iterations, z_values, _, max_iterations, escape_radius = results
 
-        return self._parallelize(tasks, _get_pixel_iterations, pixel_jobs)
+        tiles = self._sort_tiles(
+            width, height, cmin, dc,
+            self._split_regions(width, height, regions, tile_size),
+            max_iterations, escape_radius)
+        tile_jobs = [(width, height, cmin, dc, max_iterations, escape_radius,
+                      tile, iterations.descriptor, z_values.descriptor, 0)
+                     for tile in tiles]
+        self._parallelize(tasks, _get_tile_iterations, tile_jobs, tiles)
+
+        return results
+
+    def generate_frames(self, frames, tasks, tile_size=None):
+        # The frames are (width, height, real_axis_range, imag_axis_range,
+        # max_iterations, escape_radius) tuples
+        return self._generate_frames(
+            _get_tile_iterations, frames, tasks, tile_size)
+
+    def generate_band(self, width, height, real_axis_range, imag_axis_range,
+                      tasks, band, tile_size=None,
+                      max_iterations=constants.MAX_ITERATIONS,
+                      escape_radius=constants.ESCAPE_RADIUS):
+        # Only the rows of the band are generated, the results hold just
+        # them and can be rendered as an image of the band height
+        cmin = complex(real_axis_range[0], imag_axis_range[0])
+        cmax = complex(real_axis_range[1], imag_axis_range[1])
+        dc = cmax - cmin
+
+        band_y, band_height = band
+        iterations = SharedBuffer('i', width * band_height)
+        z_values = SharedBuffer('d', width * band_height)
+        results = (iterations, z_values, abs(dc),
+                   max_iterations, escape_radius)
+
+        tiles = self._sort_tiles(
+            width, height, cmin, dc,
+            self._split_regions(width, height,
+                                [(0, band_y, width, band_height)], tile_size),
+            max_iterations, escape_radius)
+        tile_jobs = [(width, height, cmin, dc, max_iterations, escape_radius,
+                      tile, iterations.descriptor, z_values.descriptor,
+                      band_y)
+                     for tile in tiles]
+        try:
+            self._parallelize(tasks, _get_tile_iterations, tile_jobs, tiles)
+        except BaseException:
+            self.release(results)
+            raise
+
+        return results
+
+
+def _get_color_density(dc, color_density):
+    if dc < 0.01:
+        color_density /= 4
+    elif dc < 0.04:
+        color_density /= 3
+    elif dc <= 0.2:
+        color_density /= 2
+
+    return color_density
 
 
 def _get_pixel_color(args):
-    iterations, z, dc = args
+    (iterations, z, color_density, max_iterations, log_escape_radius,
+     color_scheme) = args
 
-    if iterations == constants.MAX_ITERATIONS:
+    if iterations == max_iterations:
         color = 0
     else:
         log_z = cmath.log(z, 2)
-        hue = iterations + 1 - abs(
-            cmath.log(log_z / constants.LOG_ESCAPE_RADIUS, 2))
-
-        color_density = constants.COLOR_DENSITY
-        if dc < 0.01:
-            color_density /= 4
-        elif dc < 0.04:
-            color_density /= 3
-        elif dc <= 0.2:
-            color_density /= 2
+        hue = iterations + 1 - abs(cmath.log(log_z / log_escape_radius, 2))
 
         color_index = int(color_density * hue)
-        if color_index >= constants.TOTAL_COLORS:
-            color_index = constants.TOTAL_COLORS - 1
+        if color_index >= len(color_scheme):
+            color_index = len(color_scheme) - 1
 
-        color = constants.COLOR_SCHEME[color_index]
+        color = color_scheme[color_index]
 
     return color
 
 
-class MandelbrotRendererCPU(CPUObject):
+def _get_tile_colors(args):
+    (width, tile, iterations, z_values, color_density,
+     max_iterations, log_escape_radius, color_scheme, colors) = args
+    tile_x, tile_y, tile_width, tile_height = tile
 
-    def __init__(self, logger):
-        CPUObject.__init__(self, logger)
+    with SharedBuffer.attach(iterations) as iterations, \
+            SharedBuffer.attach(z_values) as z_values, \
+            SharedBuffer.attach(colors) as colors:
+        iterations_values = iterations.values
+        z_values_values = z_values.values
+        colors_values = colors.values
 
-    def render(self, width, height, results, tasks):
-        image = Image.new('RGB', (width, height))
+        for y in range(tile_y, tile_y + tile_height):
+            begin = y * width + tile_x
+            colors_values[begin:begin + tile_width] = array('i', [
+                _get_pixel_color(
+                    (iterations_values[pixel], z_values_values[pixel],
+                     color_density, max_iterations, log_escape_radius,
+                     color_scheme))
+                for pixel in range(begin, begin + tile_width)])
 
-        pixels = self._parallelize(tasks, _get_pixel_color, results)
-        image.putdata(pixels)
 
-        return image
+class MandelbrotRendererCPU(CPUObject):
+
+    def __init__(self, logger, pool=None):
+        CPUObject.__init__(self, logger, pool)
+        self._color_scheme = array('i', constants.COLOR_SCHEME)
+
+    def render(self, width, height, results, tasks, color_density=None,
+               regions=None, image=None, color_scheme=None):
+        # With regions, only they are rendered and pasted onto the image.
+        # The color scheme is a list of 0x00BBGGRR colors.
+        iterations, z_values, dc, max_iterations, escape_radius = results
+        color_scheme = self._color_scheme if color_scheme is None \
+            else array('i', color_scheme)
+        if color_density is None:
+            color_density = constants.get_color_density(max_iterations)
+        color_density = _get_color_density(dc, color_density)
+
+        tiles = self._split_regions(width, height, regions)
+        colors = SharedBuffer('i', width * height)
+        try:
+            tile_jobs = [(width, tile, iterations.descriptor,
+                          z_values.descriptor, color_density,
+                          max_iterations, math.log(escape_radius, 2),
+                          color_scheme, colors.descriptor)
+                         for tile in tiles]
+            self._parallelize(tasks, _get_tile_colors, tile_jobs, tiles)
+
+            frame = Image.frombytes(
+                'RGB', (width, height), colors.values.tobytes(),
+                'raw', RAW_COLOR_MODE)
+        finally:
+            colors.release()
+
+        return self._paste_regions(frame, regions, image)
 
 
 class MandelbrotCPU(MandelbrotGeneratorCPU, MandelbrotRendererCPU):
 
-    def __init__(self, logger):
-        MandelbrotGeneratorCPU.__init__(self, logger)
-        MandelbrotRendererCPU.__init__(self, logger)
+    def __init__(self, logger, pool=None):
+        MandelbrotGeneratorCPU.__init__(self, logger, pool)
+        MandelbrotRendererCPU.__init__(self, logger, pool)
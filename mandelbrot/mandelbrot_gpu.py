@@ -1,3 +1,4 @@
+import math
 from PIL import Image
 
 try:
@@ -14,6 +15,7 @@ if GPU_ACCELERATION_AVAILABLE:
     from pycuda.compiler import SourceModule
 
 from mandelbrot import constants
+from mandelbrot.mandelbrot_cpu import _get_color_density
 
 
 def is_gpu_accelerated():
@@ -27,17 +29,16 @@ class GPUObject(object):
         #include <math.h>
         typedef pycuda::complex<float> complex;
 
-        #define MAX_ITERATIONS %(MAX_ITERATIONS)s
-        #define ESCAPE_RADIUS %(ESCAPE_RADIUS)s
-
-    """ % ({'MAX_ITERATIONS': constants.MAX_ITERATIONS,
-            'ESCAPE_RADIUS': constants.ESCAPE_RADIUS})
+    """
 
     _block_size = (64, 4, 1)
 
     def __init__(self, logger):
         self._logger = logger
 
+    def release(self, results):
+        pass
+
     def _generate_kernel_module(self, kernel_code):
         return SourceModule('%s%s' % (self._kernel_headers, kernel_code))
 
@@ -45,6 +46,7 @@ class GPUObject(object):
 GENERATING_KERNEL_CODE = """
     __device__ int _get_pixel_iterations(
             int width, int height, complex cmin, complex dc,
+            int max_iterations, float escape_radius,
             int x, int y, complex & z) {
         float fx = x / (float)(width - 1),
               fy = y / (float)(height - 1);
@@ -53,7 +55,7 @@ GENERATING_KERNEL_CODE = """
         z = c;
 
         int iteration = 0;
-        while(iteration < MAX_ITERATIONS && abs(z) < ESCAPE_RADIUS) {
+        while(iteration < max_iterations && abs(z) < escape_radius) {
             z = z * z + c;
             iteration++;
         }
@@ -64,14 +66,16 @@ GENERATING_KERNEL_CODE = """
     __global__ void get_pixel_iterations(
             int * iterations, float * z_values,
             int width, int height,
-            complex cmin, complex dc) {
+            complex cmin, complex dc,
+            int max_iterations, float escape_radius) {
         int x = threadIdx.x + blockDim.x * blockIdx.x;
         int y = threadIdx.y + blockDim.y * blockIdx.y;
 
         if (x < width && y < height) {
             complex cz;
             iterations[y * width + x] = _get_pixel_iterations(
-                width, height, cmin, dc, x, y, cz);
+                width, height, cmin, dc, max_iterations, escape_radius,
+                x, y, cz);
             z_values[y * width + x] = abs(cz);
         }
     }
@@ -89,7 +93,9 @@ class MandelbrotGeneratorGPU(GPUObject):
         self._get_pixel_iterations = kernel_module.get_function(
             'get_pixel_iterations')
 
-    def generate(self, width, height, real_axis_range, imag_axis_range, tasks):
+    def generate(self, width, height, real_axis_range, imag_axis_range, tasks,
+                 tile_size=None, max_iterations=constants.MAX_ITERATIONS,
+                 escape_radius=constants.ESCAPE_RADIUS):
         if not is_gpu_accelerated():
             self._logger.error(
                 'No GPU acceleration is available, please use CPU.')
@@ -113,67 +119,53 @@ class MandelbrotGeneratorGPU(GPUObject):
             iterations_gpu, z_values_gpu,
             np.int32(width), np.int32(height),
             np.complex64(cmin), np.complex64(dc),
+            np.int32(max_iterations), np.float32(escape_radius),
             block=self._block_size, grid=grid_size)
 
-        return (iterations_gpu, z_values_gpu, abs(dc))
+        return (iterations_gpu, z_values_gpu, abs(dc),
+                max_iterations, escape_radius)
 
 
 RENDERING_KERNEL_CODE = """
-    #define LOG_ESCAPE_RADIUS %(LOG_ESCAPE_RADIUS)s
-    #define COLOR_DENSITY %(COLOR_DENSITY)s
-    #define TOTAL_COLORS %(TOTAL_COLORS)s
-
     __device__ int _get_pixel_color(
-            int iteration_count, float z_value, float dc,
-            int * color_scheme) {
+            int iteration_count, float z_value,
+            float color_density, float log_escape_radius,
+            int * color_scheme, int total_colors) {
         float log_z = log2(z_value);
         float hue = iteration_count + 1 - abs(
-            log2(log_z / LOG_ESCAPE_RADIUS));
-
-        float color_density = COLOR_DENSITY;
-        if (dc < 0.01)
-        {
-            color_density /= 4;
-        }
-        else if (dc < 0.04)
-        {
-            color_density /= 3;
-        }
-        else if (dc < 0.2)
-        {
-            color_density /= 2;
-        }
+            log2(log_z / log_escape_radius));
 
         int color_index = int(color_density * hue);
-        if (color_index >= TOTAL_COLORS) {
-            color_index = TOTAL_COLORS - 1;
+        if (color_index >= total_colors) {
+            color_index = total_colors - 1;
         }
 
         return color_scheme[color_index];
     }
 
     __global__ void get_pixel_color(
-            int * colors, int * color_scheme,
+            int * colors, int * color_scheme, int total_colors,
             int * iterations, float * z_values,
-            int width, int height, float dc) {
+            int width, int height, float color_density,
+            int max_iterations, float log_escape_radius) {
         int x = threadIdx.x + blockDim.x * blockIdx.x;
         int y = threadIdx.y + blockDim.y * blockIdx.y;
 
         if (x < width && y < height) {
             int iteration_count = iterations[y * width + x];
-            if (iteration_count == MAX_ITERATIONS) {
+            if (iteration_count == max_iterations) {
                 colors[y * width + x] = 0;
             } else {
                 float z_value = z_values[y * width + x];
 
                 colors[y * width + x] = _get_pixel_color(
-                    iteration_count, z_value, dc, color_scheme);
+                    iteration_count, z_value,
+                    color_density, log_escape_radius,
+                    color_scheme, total_colors);
             }
         }
     }
-""" % ({'LOG_ESCAPE_RADIUS': int(constants.LOG_ESCAPE_RADIUS),
-        'COLOR_DENSITY': constants.COLOR_DENSITY,
-        'TOTAL_COLORS': constants.TOTAL_COLORS})
+"""
 
 
 class MandelbrotRendererGPU(GPUObject):
@@ -190,7 +182,8 @@ class MandelbrotRendererGPU(GPUObject):
         color_scheme = np.asarray(constants.COLOR_SCHEME, np.int32)
         self._color_scheme_gpu = gpuarray.to_gpu(color_scheme)
 
-    def render(self, width, height, results, tasks):
+    def render(self, width, height, results, tasks, color_density=None,
+               color_scheme=None):
         if not is_gpu_accelerated():
             self._logger.error(
                 'No GPU acceleration is available, please use CPU.')
@@ -198,7 +191,15 @@ class MandelbrotRendererGPU(GPUObject):
 
         image = Image.new('RGB', (width, height))
 
-        iterations_gpu, z_values_gpu, dc = results
+        iterations_gpu, z_values_gpu, dc, max_iterations, escape_radius = \
+            results
+        if color_density is None:
+            color_density = constants.get_color_density(max_iterations)
+        color_density = _get_color_density(dc, color_density)
+
+        color_scheme_gpu = self._color_scheme_gpu \
+            if color_scheme is None else \
+            gpuarray.to_gpu(np.asarray(color_scheme, np.int32))
 
         colors = np.empty(width * height, np.int32)
         colors_gpu = gpuarray.to_gpu(colors)
@@ -208,9 +209,10 @@ class MandelbrotRendererGPU(GPUObject):
         grid_size = ((dx + (mx > 0)), (dy + (my > 0)))
 
         self._get_pixel_color(
-            colors_gpu, self._color_scheme_gpu,
+            colors_gpu, color_scheme_gpu, np.int32(color_scheme_gpu.size),
             iterations_gpu, z_values_gpu,
-            np.int32(width), np.int32(height), np.float32(dc),
+            np.int32(width), np.int32(height), np.float32(color_density),
+            np.int32(max_iterations), np.float32(math.log(escape_radius, 2)),
             block=self._block_size, grid=grid_size)
 
         colors = colors_gpu.get()
@@ -0,0 +1,934 @@
+import math
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:
+    NUMPY_ACCELERATION_AVAILABLE = False
+else:
+    NUMPY_ACCELERATION_AVAILABLE = True
+
+from mandelbrot import constants
+from mandelbrot.mandelbrot_cpu import CPUObject, _get_color_density
+from mandelbrot.shared_buffer import SharedBuffer
+
+
+def is_numpy_accelerated():
+    return NUMPY_ACCELERATION_AVAILABLE
+
+
+def _get_main_bulbs_mask(c_real, c_imag):
+    # The main cardioid and the period-2 bulb are inside the set
+    q = (c_real - 0.25) ** 2 + c_imag ** 2
+    cardioid = q * (q + (c_real - 0.25)) < 0.25 * c_imag ** 2
+    bulb = (c_real + 1) ** 2 + c_imag ** 2 < 0.0625
+
+    return cardioid | bulb
+
+
+def _get_points_iterations(c_real, c_imag, max_iterations, escape_radius):
+    # Same escape-time loop as mandelbrot_cpu._get_pixel_iterations, but
+    # over a whole array of points. Only the points which have not escaped
+    # yet are kept in the working arrays, so every step gets cheaper.
+    # The complex product and abs() are spelled out on the real and
+    # imaginary parts so the results match the Python complex type bit
+    # for bit.
+    iterations = np.full(c_real.shape, max_iterations, np.int32)
+    z_values = np.hypot(c_real, c_imag)
+
+    index = np.flatnonzero((z_values < escape_radius) &
+                           ~_get_main_bulbs_mask(c_real, c_imag))
+    iterations[z_values >= escape_radius] = 0
+
+    c_real, c_imag = c_real[index], c_imag[index]
+    z_real, z_imag = c_real, c_imag
+    saved_real, saved_imag, period_check = z_real, z_imag, 1
+
+    for iteration in range(1, max_iterations + 1):
+        if not index.size:
+            break
+
+        z_real, z_imag = (z_real * z_real - z_imag * z_imag + c_real,
+                          z_real * z_imag + z_imag * z_real + c_imag)
+        abs_z = np.hypot(z_real, z_imag)
+
+        escaped = abs_z >= escape_radius
+        # Brent's cycle detection: an orbit which returns exactly to an
+        # earlier value repeats forever and never escapes
+        periodic = (z_real == saved_real) & (z_imag == saved_imag)
+
+        finished = escaped | periodic
+        if finished.any():
+            escaped_index = index[escaped]
+            iterations[escaped_index] = iteration
+            z_values[escaped_index] = abs_z[escaped]
+            z_values[index[periodic]] = abs_z[periodic]
+
+            running = ~finished
+            index = index[running]
+            z_real, z_imag = z_real[running], z_imag[running]
+            c_real, c_imag = c_real[running], c_imag[running]
+            saved_real, saved_imag = saved_real[running], saved_imag[running]
+
+        if iteration == period_check:
+            saved_real, saved_imag = z_real, z_imag
+            period_check *= 2
+
+    z_values[index] = np.hypot(z_real, z_imag)
+
+    return iterations, z_values
+
+
+def _get_pixels_iterations(width, height, cmin, dc, x, y,
+                           max_iterations, escape_radius):
+    fx = x / float(width - 1)
+    fy = y / float(height - 1)
+
+    return _get_points_iterations(
+        cmin.real + fx * dc.real, cmin.imag + fy * dc.imag,
+        max_iterations, escape_radius)
+
+
+def _get_tile_iterations(args):
+    # The first row of the buffers is the row_offset-th row of the frame
+    (width, height, cmin, dc, max_iterations, escape_radius,
+     tile, iterations, z_values, row_offset) = args
+    tile_x, tile_y, tile_width, tile_height = tile
+
+    x, y = np.meshgrid(np.arange(tile_x, tile_x + tile_width),
+                       np.arange(tile_y, tile_y + tile_height))
+
+    tile_iterations, tile_z_values = _get_pixels_iterations(
+        width, height, cmin, dc, x.ravel(), y.ravel(),
+        max_iterations, escape_radius)
+
+    tile_region = (slice(tile_y - row_offset,
+                         tile_y - row_offset + tile_height),
+                   slice(tile_x, tile_x + tile_width))
+    with SharedBuffer.attach(iterations) as iterations, \
+            SharedBuffer.attach(z_values) as z_values:
+        iterations.as_array((-1, width))[tile_region] = \
+            tile_iterations.reshape(tile_height, tile_width)
+        z_values.as_array((-1, width))[tile_region] = \
+            tile_z_values.reshape(tile_height, tile_width)
+
+
+SUBDIVISION_MIN_SIZE = 4
+
+
+def _get_tile_subdivision(args):
+    # Mariani-Silver: the border of a rectangle is computed first and when
+    # it is all inside the set, the connectedness of the set guarantees
+    # that the inside of the rectangle is too. A border with a single
+    # escape count has its inside computed at once, since the smooth
+    # colouring needs the |z| of every pixel. Otherwise the rectangle is
+    # split in two halves which share the middle line. All rectangles of
+    # one level are computed with a single call of the kernel.
+    (width, height, cmin, dc, max_iterations, escape_radius,
+     tile, iterations, z_values) = args
+    tile_x, tile_y, tile_width, tile_height = tile
+
+    with SharedBuffer.attach(iterations) as iterations, \
+            SharedBuffer.attach(z_values) as z_values:
+        iterations_values = iterations.as_array((height, width))[
+            tile_y:tile_y + tile_height, tile_x:tile_x + tile_width]
+        z_values_values = z_values.as_array((height, width))[
+            tile_y:tile_y + tile_height, tile_x:tile_x + tile_width]
+
+        known = np.zeros((tile_height, tile_width), bool)
+        computed, filled = 0, 0
+
+        def compute(pending):
+            y, x = np.nonzero(pending & ~known)
+            if x.size:
+                iterations_values[y, x], z_values_values[y, x] = \
+                    _get_pixels_iterations(
+                        width, height, cmin, dc, x + tile_x, y + tile_y,
+                        max_iterations, escape_radius)
+                known[y, x] = True
+
+            return x.size
+
+        rectangles = [(0, 0, tile_width - 1, tile_height - 1)]
+        while rectangles:
+            pending = np.zeros((tile_height, tile_width), bool)
+            for x0, y0, x1, y1 in rectangles:
+                pending[y0:y1 + 1, x0:x1 + 1:x1 - x0 or 1] = True
+                pending[y0:y1 + 1:y1 - y0 or 1, x0:x1 + 1] = True
+            computed += compute(pending)
+
+            pending[:] = False
+            subdivided = []
+            for x0, y0, x1, y1 in rectangles:
+                inside = (slice(y0 + 1, y1), slice(x0 + 1, x1))
+                if x1 - x0 < SUBDIVISION_MIN_SIZE or \
+                        y1 - y0 < SUBDIVISION_MIN_SIZE:
+                    pending[inside] = True
+                    continue
+
+                border_iterations = np.concatenate([
+                    iterations_values[y0, x0:x1 + 1],
+                    iterations_values[y1, x0:x1 + 1],
+                    iterations_values[y0:y1 + 1, x0],
+                    iterations_values[y0:y1 + 1, x1]])
+                if (border_iterations == border_iterations[0]).all():
+                    if border_iterations[0] == max_iterations:
+                        iterations_values[inside] = max_iterations
+                        known[inside] = True
+                        filled += (y1 - y0 - 1) * (x1 - x0 - 1)
+                    else:
+                        pending[inside] = True
+                elif x1 - x0 > y1 - y0:
+                    middle = (x0 + x1) // 2
+                    subdivided += [(x0, y0, middle, y1), (middle, y0, x1, y1)]
+                else:
+                    middle = (y0 + y1) // 2
+                    subdivided += [(x0, y0, x1, middle), (x0, middle, x1, y1)]
+            computed += compute(pending)
+
+            rectangles = subdivided
+
+        # The views have to be dropped before the memory is closed
+        del iterations_values, z_values_values
+
+    return computed, filled
+
+
+PROGRESSIVE_STRIDES = (8, 4, 2, 1)
+
+
+def _get_tile_pass_iterations(args):
+    # One pass of the progressive generation computes the pixels on every
+    # stride-th row and column, except for the ones which the previous
+    # (coarser) pass has already computed
+    (width, height, cmin, dc, max_iterations, escape_radius,
+     tile, stride, previous_stride, iterations, z_values) = args
+    tile_x, tile_y, tile_width, tile_height = tile
+
+    x, y = np.meshgrid(
+        np.arange(tile_x + (-tile_x % stride), tile_x + tile_width, stride),
+        np.arange(tile_y + (-tile_y % stride), tile_y + tile_height, stride))
+    if previous_stride:
+        pending = (x % previous_stride != 0) | (y % previous_stride != 0)
+        x, y = x[pending], y[pending]
+    else:
+        x, y = x.ravel(), y.ravel()
+
+    pass_iterations, pass_z_values = _get_pixels_iterations(
+        width, height, cmin, dc, x, y, max_iterations, escape_radius)
+
+    with SharedBuffer.attach(iterations) as iterations, \
+            SharedBuffer.attach(z_values) as z_values:
+        iterations.as_array((height, width))[y, x] = pass_iterations
+        z_values.as_array((height, width))[y, x] = pass_z_values
+
+
+def _get_tile_masked_iterations(args):
+    # Computes only the pixels of the tile which are set in the mask
+    (width, height, cmin, dc, max_iterations, escape_radius,
+     tile, mask, iterations, z_values) = args
+    tile_x, tile_y, tile_width, tile_height = tile
+
+    tile_region = (slice(tile_y, tile_y + tile_height),
+                   slice(tile_x, tile_x + tile_width))
+    with SharedBuffer.attach(mask) as mask:
+        y, x = np.nonzero(mask.as_array((height, width))[tile_region])
+    if not x.size:
+        return
+
+    y, x = y + tile_y, x + tile_x
+    masked_iterations, masked_z_values = _get_pixels_iterations(
+        width, height, cmin, dc, x, y, max_iterations, escape_radius)
+
+    with SharedBuffer.attach(iterations) as iterations, \
+            SharedBuffer.attach(z_values) as z_values:
+        iterations.as_array((height, width))[y, x] = masked_iterations
+        z_values.as_array((height, width))[y, x] = masked_z_values
+
+
+def _get_smooth_iterations(iterations, z_values, log_escape_radius):
+    return iterations + 1 - np.log2(np.log2(z_values) / log_escape_radius)
+
+
+def _resample_field(width, height, cmin, dc, max_iterations, escape_radius,
+                    previous, tolerance):
+    # Seeds the pixels of a frame from the four nearest pixels of the
+    # previous frame around the same point. For the escaped points the
+    # smooth iteration count is interpolated when all four escaped and
+    # their smooth counts differ by less than the tolerance. The error of
+    # every reused pixel is the difference plus the largest error of the
+    # four pixels it was taken from, so the errors add up over the frames
+    # and stay bounded by the tolerance. The points inside the set have no
+    # smooth count to bound, they are reused only with a tolerance above
+    # zero, when all four are inside the set, and the caller generates the
+    # ring around them again to check it (see generate_resampled).
+    # Returns the reused points inside the set and the mask of the points
+    # to generate as well.
+    (previous_width, previous_height, previous_cmin, previous_dc,
+     previous_iterations, previous_z_values, previous_errors,
+     previous_max_iterations) = previous
+    log_escape_radius = math.log(escape_radius, 2)
+
+    x = np.arange(width) / float(width - 1)
+    y = np.arange(height) / float(height - 1)
+    x = (cmin.real + x * dc.real - previous_cmin.real) / \
+        previous_dc.real * (previous_width - 1)
+    y = (cmin.imag + y * dc.imag - previous_cmin.imag) / \
+        previous_dc.imag * (previous_height - 1)
+    x, y = np.meshgrid(x, y)
+
+    x0, y0 = np.floor(x).astype(np.intp), np.floor(y).astype(np.intp)
+    covered = (x0 >= 0) & (x0 < previous_width - 1) & \
+        (y0 >= 0) & (y0 < previous_height - 1)
+    x0, y0 = np.where(covered, x0, 0), np.where(covered, y0, 0)
+    wx, wy = x - x0, y - y0
+
+    neighbours = [(y0, x0), (y0, x0 + 1), (y0 + 1, x0), (y0 + 1, x0 + 1)]
+    weights = np.stack(
+        [(1 - wy) * (1 - wx), (1 - wy) * wx, wy * (1 - wx), wy * wx])
+    neighbour_iterations = np.stack(
+        [previous_iterations[neighbour] for neighbour in neighbours])
+    neighbour_z_values = np.stack(
+        [previous_z_values[neighbour] for neighbour in neighbours])
+    neighbour_errors = np.stack(
+        [previous_errors[neighbour] for neighbour in neighbours])
+
+    # The thin escaping filaments between the points inside the set are
+    # missed less often, when the neighbours of the four are inside too
+    previous_inside = np.pad(previous_iterations == previous_max_iterations,
+                             1, 'constant')
+    previous_inside = previous_inside[1:-1, 1:-1] & \
+        previous_inside[:-2, 1:-1] & previous_inside[2:, 1:-1] & \
+        previous_inside[1:-1, :-2] & previous_inside[1:-1, 2:]
+    inside = covered & np.stack(
+        [previous_inside[neighbour] for neighbour in neighbours]).all(axis=0)
+    if max_iterations != previous_max_iterations or tolerance <= 0:
+        # A larger budget may let the points escape after all
+        inside[:] = False
+    # Nothing outside of the frame is generated to check the border
+    inside[[0, -1], :] = False
+    inside[:, [0, -1]] = False
+
+    escaped = covered & (neighbour_iterations < min(
+        previous_max_iterations, max_iterations)).all(axis=0)
+    smooth_iterations = _get_smooth_iterations(
+        neighbour_iterations, np.where(
+            escaped, neighbour_z_values, 2.0 * escape_radius),
+        log_escape_radius)
+    errors = smooth_iterations.max(axis=0) - smooth_iterations.min(axis=0) + \
+        neighbour_errors.max(axis=0)
+    escaped &= errors <= tolerance
+
+    # The interpolated smooth count is split back into an iteration count
+    # and the |z| which give the same colour
+    smooth_iterations = (weights * smooth_iterations).sum(axis=0)[escaped]
+    escaped_iterations = np.maximum(np.ceil(smooth_iterations) - 1, 0)
+
+    iterations = np.zeros((height, width), np.int32)
+    z_values = np.zeros((height, width))
+    iterations[inside] = max_iterations
+    iterations[escaped] = escaped_iterations
+    z_values[escaped] = np.exp2(log_escape_radius * np.exp2(
+        escaped_iterations + 1 - smooth_iterations))
+
+    errors = np.where(escaped, errors, 0.0)
+
+    return iterations, z_values, errors, inside, ~(inside | escaped)
+
+
+def _get_tile_lattice(width, height, cmin, dc):
+    # Views with the same pixel pitch share one grid of pixels over the
+    # whole plane, up to the fraction of a pixel by which they are offset.
+    # The tiles are aligned to this grid, so overlapping views find the
+    # same tiles in the cache.
+    pitch = (dc.real / (width - 1), dc.imag / (height - 1))
+    position = (cmin.real / pitch[0], cmin.imag / pitch[1])
+    origin = (int(round(position[0])), int(round(position[1])))
+
+    key = ('%.12g' % pitch[0], '%.12g' % pitch[1],
+           '%.6f' % (position[0] - origin[0]),
+           '%.6f' % (position[1] - origin[1]))
+
+    return origin, key
+
+
+class MandelbrotGeneratorNumPy(CPUObject):
+
+    def __init__(self, logger, pool=None, cache=None):
+        CPUObject.__init__(self, logger, pool)
+        self._cache = cache
+
+    def _get_probe_costs(self, width, height, cmin, dc, x, y,
+                         max_iterations, escape_radius):
+        if not is_numpy_accelerated():
+            return CPUObject._get_probe_costs(
+                self, width, height, cmin, dc, x, y,
+                max_iterations, escape_radius)
+
+        x, y = np.array(x), np.array(y)
+        iterations, _ = _get_pixels_iterations(
+            width, height, cmin, dc, x, y, max_iterations, escape_radius)
+        # The main bulbs are skipped without iterating them
+        main_bulbs = _get_main_bulbs_mask(
+            cmin.real + x / float(width - 1) * dc.real,
+            cmin.imag + y / float(height - 1) * dc.imag)
+
+        return np.where(main_bulbs, 1, iterations + 1).tolist()
+
+    def generate(self, width, height, real_axis_range, imag_axis_range, tasks,
+                 tile_size=None, max_iterations=constants.MAX_ITERATIONS,
+                 escape_radius=constants.ESCAPE_RADIUS):
+        if not is_numpy_accelerated():
+            self._logger.error(
+                'No NumPy acceleration is available, please use CPU.')
+            return
+
+        cmin = complex(real_axis_range[0], imag_axis_range[0])
+        cmax = complex(real_axis_range[1], imag_axis_range[1])
+        dc = cmax - cmin
+
+        iterations = SharedBuffer('i', width * height)
+        z_values = SharedBuffer('d', width * height)
+        results = (iterations, z_values, abs(dc),
+                   max_iterations, escape_radius)
+
+        if self._cache is None:
+            tiles = self._split_tiles(width, height, tile_size)
+        else:
+            origin, lattice_key = _get_tile_lattice(width, height, cmin, dc)
+            tiles = self._split_tiles(width, height, tile_size, origin)
+            tile_keys = dict(
+                (tile, lattice_key + (max_iterations, escape_radius,
+                                      origin[0] + tile[0],
+                                      origin[1] + tile[1]) + tile[2:])
+                for tile in tiles)
+            tiles = self._load_cached_tiles(
+                width, height, tiles, tile_keys, results)
+
+        tiles = self._sort_tiles(width, height, cmin, dc, tiles,
+                                 max_iterations, escape_radius)
+        tile_jobs = [(width, height, cmin, dc, max_iterations, escape_radius,
+                      tile, iterations.descriptor, z_values.descriptor, 0)
+                     for tile in tiles]
+        try:
+            self._parallelize(tasks, _get_tile_iterations, tile_jobs, tiles)
+        except BaseException:
+            self.release(results)
+            raise
+
+        if self._cache is not None:
+            self._store_cached_tiles(
+                width, height, tiles, tile_keys, results)
+
+        return results
+
+    def generate_regions(self, width, height, real_axis_range,
+                         imag_axis_range, tasks, results, regions,
+                         tile_size=None):
+        # Computes only the given regions of the frame into the results
+        if not is_numpy_accelerated():
+            self._logger.error(
+                'No NumPy acceleration is available, please use CPU.')
+            return
+
+        cmin = complex(real_axis_range[0], imag_axis_range[0])
+        cmax = complex(real_axis_range[1], imag_axis_range[1])
+        dc = cmax - cmin
+
+        iterations, z_values, _, max_iterations, escape_radius = results
+
+        tiles = self._sort_tiles(
+            width, height, cmin, dc,
+            self._split_regions(width, height, regions, tile_size),
+            max_iterations, escape_radius)
+        tile_jobs = [(width, height, cmin, dc, max_iterations, escape_radius,
+                      tile, iterations.descriptor, z_values.descriptor, 0)
+                     for tile in tiles]
+        self._parallelize(tasks, _get_tile_iterations, tile_jobs, tiles)
+
+        return results
+
+    def generate_frames(self, frames, tasks, tile_size=None):
+        # The frames are (width, height, real_axis_range, imag_axis_range,
+        # max_iterations, escape_radius) tuples
+        if not is_numpy_accelerated():
+            self._logger.error(
+                'No NumPy acceleration is available, please use CPU.')
+            return iter([])
+
+        return self._generate_frames(
+            _get_tile_iterations, frames, tasks, tile_size)
+
+    def generate_band(self, width, height, real_axis_range, imag_axis_range,
+                      tasks, band, tile_size=None,
+                      max_iterations=constants.MAX_ITERATIONS,
+                      escape_radius=constants.ESCAPE_RADIUS):
+        # Only the rows of the band are generated, the results hold just
+        # them and can be rendered as an image of the band height
+        if not is_numpy_accelerated():
+            self._logger.error(
+                'No NumPy acceleration is available, please use CPU.')
+            return
+
+        cmin = complex(real_axis_range[0], imag_axis_range[0])
+        cmax = complex(real_axis_range[1], imag_axis_range[1])
+        dc = cmax - cmin
+
+        band_y, band_height = band
+        iterations = SharedBuffer('i', width * band_height)
+        z_values = SharedBuffer('d', width * band_height)
+        results = (iterations, z_values, abs(dc),
+                   max_iterations, escape_radius)
+
+        tiles = self._sort_tiles(
+            width, height, cmin, dc,
+            self._split_regions(width, height,
+                                [(0, band_y, width, band_height)], tile_size),
+            max_iterations, escape_radius)
+        tile_jobs = [(width, height, cmin, dc, max_iterations, escape_radius,
+                      tile, iterations.descriptor, z_values.descriptor,
+                      band_y)
+                     for tile in tiles]
+        try:
+            self._parallelize(tasks, _get_tile_iterations, tile_jobs, tiles)
+        except BaseException:
+            self.release(results)
+            raise
+
+        return results
+
+    def generate_resampled(self, width, height, real_axis_range,
+                           imag_axis_range, tasks, previous, tolerance,
+                           tile_size=None,
+                           max_iterations=constants.MAX_ITERATIONS,
+                           escape_radius=constants.ESCAPE_RADIUS):
+        # Generates a frame of a zoom, reusing the pixels of the previous
+        # frame (from this method) which are known within the tolerance.
+        # Returns the results and the state for the next frame.
+        if not is_numpy_accelerated():
+            self._logger.error(
+                'No NumPy acceleration is available, please use CPU.')
+            return
+
+        cmin = complex(real_axis_range[0], imag_axis_range[0])
+        cmax = complex(real_axis_range[1], imag_axis_range[1])
+        dc = cmax - cmin
+
+        iterations = SharedBuffer('i', width * height)
+        z_values = SharedBuffer('d', width * height)
+        mask = SharedBuffer('b', width * height)
+        results = (iterations, z_values, abs(dc),
+                   max_iterations, escape_radius)
+
+        try:
+            mask_values = mask.as_array((height, width))
+            try:
+                if previous is None:
+                    errors = np.zeros((height, width))
+                    inside = np.zeros((height, width), bool)
+                    mask_values[:] = 1
+                else:
+                    (iterations.as_array((height, width))[:],
+                     z_values.as_array((height, width))[:],
+                     errors, inside, mask_values[:]) = _resample_field(
+                        width, height, cmin, dc, max_iterations,
+                        escape_radius, previous, tolerance)
+                computed = int(np.count_nonzero(mask_values))
+            finally:
+                # The view has to be dropped before the mask is released
+                del mask_values
+
+            tiles = self._split_tiles(width, height, tile_size)
+            tile_jobs = [(width, height, cmin, dc,
+                          max_iterations, escape_radius, tile,
+                          mask.descriptor, iterations.descriptor,
+                          z_values.descriptor)
+                         for tile in tiles]
+            self._parallelize(tasks, _get_tile_masked_iterations, tile_jobs,
+                              tiles)
+            computed += self._check_inside(width, height, tasks, inside,
+                                           max_iterations, mask, iterations,
+                                           tiles, tile_jobs)
+        except BaseException:
+            self.release(results)
+            raise
+        finally:
+            mask.release()
+
+        self._logger.debug('%s of %s pixels reused from the previous frame'
+                           % (width * height - computed, width * height))
+
+        # The state keeps copies, the results are released by the caller
+        state = (width, height, cmin, dc,
+                 iterations.as_array((height, width)).copy(),
+                 z_values.as_array((height, width)).copy(),
+                 errors, max_iterations)
+
+        return results, state
+
+    def _check_inside(self, width, height, tasks, inside, max_iterations,
+                      mask, iterations, tiles, tile_jobs):
+        # An escaping filament may cross the interior reused from the
+        # previous frame between its pixels. The reused pixels next to a
+        # generated pixel which escaped, diagonally too, are generated as
+        # well, until the reused interior is surrounded by generated pixels
+        # inside the set. A filament too thin to hit any of them is still
+        # missed. Returns the number of the pixels generated again.
+        computed = 0
+        mask_values = mask.as_array((height, width))
+        iterations_values = iterations.as_array((height, width))
+        try:
+            outside = mask_values.astype(bool) & \
+                (iterations_values < max_iterations)
+            while True:
+                outside = np.pad(outside, 1, 'constant')
+                outside = outside[:-2] | outside[1:-1] | outside[2:]
+                outside = inside & (outside[:, :-2] | outside[:, 1:-1] |
+                                    outside[:, 2:])
+                if not outside.any():
+                    return computed
+
+                inside &= ~outside
+                mask_values[:] = outside
+                computed += int(np.count_nonzero(outside))
+                jobs = [(tile_job, tile)
+                        for tile_job, tile in zip(tile_jobs, tiles)
+                        if outside[tile[1]:tile[1] + tile[3],
+                                   tile[0]:tile[0] + tile[2]].any()]
+                self._parallelize(tasks, _get_tile_masked_iterations,
+                                  [tile_job for tile_job, _ in jobs],
+                                  [tile for _, tile in jobs])
+                outside &= iterations_values < max_iterations
+        finally:
+            # The views have to be dropped before the buffers are released
+            del mask_values, iterations_values
+
+    def _load_cached_tiles(self, width, height, tiles, tile_keys, results):
+        iterations = results[0].as_array((height, width))
+        z_values = results[1].as_array((height, width))
+
+        missing_tiles = []
+        for tile in tiles:
+            cached_tile = self._cache.get(tile_keys[tile])
+            if cached_tile is None:
+                missing_tiles.append(tile)
+                continue
+
+            tile_x, tile_y, tile_width, tile_height = tile
+            tile_region = (slice(tile_y, tile_y + tile_height),
+                           slice(tile_x, tile_x + tile_width))
+            iterations[tile_region], z_values[tile_region] = cached_tile
+
+        self._logger.debug('Tiles reused from the cache: %s of %s'
+                           % (len(tiles) - len(missing_tiles), len(tiles)))
+
+        return missing_tiles
+
+    def _store_cached_tiles(self, width, height, tiles, tile_keys, results):
+        iterations = results[0].as_array((height, width))
+        z_values = results[1].as_array((height, width))
+
+        for tile in tiles:
+            tile_x, tile_y, tile_width, tile_height = tile
+            tile_region = (slice(tile_y, tile_y + tile_height),
+                           slice(tile_x, tile_x + tile_width))
+            self._cache.put(tile_keys[tile],
+                            iterations[tile_region].copy(),
+                            z_values[tile_region].copy())
+
+    def generate_subdivision(self, width, height, real_axis_range,
+                             imag_axis_range, tasks, tile_size=None,
+                             max_iterations=constants.MAX_ITERATIONS,
+                             escape_radius=constants.ESCAPE_RADIUS):
+        if not is_numpy_accelerated():
+            self._logger.error(
+                'No NumPy acceleration is available, please use CPU.')
+            return
+
+        cmin = complex(real_axis_range[0], imag_axis_range[0])
+        cmax = complex(real_axis_range[1], imag_axis_range[1])
+        dc = cmax - cmin
+
+        iterations = SharedBuffer('i', width * height)
+        z_values = SharedBuffer('d', width * height)
+        results = (iterations, z_values, abs(dc),
+                   max_iterations, escape_radius)
+
+        tiles = self._sort_tiles(
+            width, height, cmin, dc,
+            self._split_tiles(width, height, tile_size),
+            max_iterations, escape_radius)
+        tile_jobs = [(width, height, cmin, dc, max_iterations, escape_radius,
+                      tile, iterations.descriptor, z_values.descriptor)
+                     for tile in tiles]
+        try:
+            statistics = self._parallelize(
+                tasks, _get_tile_subdivision, tile_jobs, tiles)
+        except BaseException:
+            self.release(results)
+            raise
+
+        computed = sum(tile_statistics[0] for tile_statistics in statistics)
+        filled = sum(tile_statistics[1] for tile_statistics in statistics)
+        self._logger.info(
+            'Subdivision computed %s pixels and filled %s pixels (%.1f%%)'
+            % (computed, filled, 100.0 * filled / (width * height)))
+
+        return results
+
+    def generate_progressive(self, width, height, real_axis_range,
+                             imag_axis_range, tasks, tile_size=None,
+                             max_iterations=constants.MAX_ITERATIONS,
+                             escape_radius=constants.ESCAPE_RADIUS,
+                             strides=PROGRESSIVE_STRIDES):
+        if not is_numpy_accelerated():
+            self._logger.error(
+                'No NumPy acceleration is available, please use CPU.')
+            return
+
+        cmin = complex(real_axis_range[0], imag_axis_range[0])
+        cmax = complex(real_axis_range[1], imag_axis_range[1])
+        dc = cmax - cmin
+
+        iterations = SharedBuffer('i', width * height)
+        z_values = SharedBuffer('d', width * height)
+        results = (iterations, z_values, abs(dc),
+                   max_iterations, escape_radius)
+
+        # Every stride has to divide the previous one, so that each pass
+        # only computes the pixels which are still missing. The buffers
+        # are released when the passes are closed before the last one,
+        # after it they belong to the caller.
+        previous_stride = 0
+        try:
+            for stride in strides:
+                tiles = self._split_tiles(width, height, tile_size)
+                tile_jobs = [(width, height, cmin, dc,
+                              max_iterations, escape_radius,
+                              tile, stride, previous_stride,
+                              iterations.descriptor, z_values.descriptor)
+                             for tile in tiles]
+                self._parallelize(
+                    tasks, _get_tile_pass_iterations, tile_jobs, tiles)
+                previous_stride = stride
+
+                yield stride, results
+        except BaseException:
+            self.release(results)
+            raise
+
+
+def _get_palette(color_scheme):
+    # Unpacks the 0x00BBGGRR colors of the scheme into an RGB lookup table
+    color_scheme = np.asarray(color_scheme, np.uint32)
+    return np.stack([(color_scheme >> shift) & 0xff
+                     for shift in (0, 8, 16)], axis=-1).astype(np.uint8)
+
+
+def _get_colors(iterations, z_values, color_density, palette,
+                max_iterations, log_escape_radius):
+    colors = np.zeros(iterations.shape + (3,), np.uint8)
+
+    escaped = iterations != max_iterations
+    log_z = np.log(z_values[escaped]) / np.log(2)
+    hue = iterations[escaped] + 1 - np.abs(
+        np.log(log_z / log_escape_radius) / np.log(2))
+
+    # Negative indices pick from the end of the scheme, as with the lists
+    color_index = np.clip(
+        np.trunc(color_density * hue), -len(palette), len(palette) - 1)
+    colors[escaped] = palette[color_index.astype(np.intp)]
+
+    return colors
+
+
+def _get_sample_offsets(samples):
+    # The samples x samples grid of points inside a pixel, as offsets from
+    # its center in pixels
+    offsets = (np.arange(samples) + 0.5) / samples - 0.5
+    return [(offset_x, offset_y) for offset_y in offsets
+            for offset_x in offsets]
+
+
+def _get_tile_supersampled_colors(args):
+    # The colors of the samples of every pixel are averaged in the tile,
+    # only the averaged colors are written to the frame
+    (width, height, cmin, dc, max_iterations, escape_radius, tile, samples,
+     adaptive, color_density, palette, colors, row_offset) = args
+    tile_x, tile_y, tile_width, tile_height = tile
+
+    log_escape_radius = math.log(escape_radius, 2)
+
+    if adaptive:
+        # The pixels are computed once with a border of one pixel and only
+        # the ones whose iteration count differs from one of their four
+        # neighbours are sampled
+        x, y = np.meshgrid(np.arange(tile_x - 1, tile_x + tile_width + 1),
+                           np.arange(tile_y - 1, tile_y + tile_height + 1))
+        iterations, z_values = _get_pixels_iterations(
+            width, height, cmin, dc, x.ravel(), y.ravel(),
+            max_iterations, escape_radius)
+        iterations = iterations.reshape(x.shape)
+        inner = (slice(1, -1), slice(1, -1))
+
+        tile_colors = _get_colors(
+            iterations[inner], z_values.reshape(x.shape)[inner],
+            color_density, palette, max_iterations,
+            log_escape_radius).astype(np.float64)
+        pixel_iterations = iterations[inner]
+        y, x = np.nonzero((pixel_iterations != iterations[:-2, 1:-1]) |
+                          (pixel_iterations != iterations[2:, 1:-1]) |
+                          (pixel_iterations != iterations[1:-1, :-2]) |
+                          (pixel_iterations != iterations[1:-1, 2:]))
+    else:
+        tile_colors = np.zeros((tile_height, tile_width, 3))
+        y, x = np.indices((tile_height, tile_width))
+        y, x = y.ravel(), x.ravel()
+
+    offsets = _get_sample_offsets(samples)
+    sample_colors = np.zeros((x.size, 3))
+    for offset_x, offset_y in offsets:
+        sample_iterations, sample_z_values = _get_pixels_iterations(
+            width, height, cmin, dc, x + tile_x + offset_x,
+            y + tile_y + offset_y, max_iterations, escape_radius)
+        sample_colors += _get_colors(
+            sample_iterations, sample_z_values, color_density, palette,
+            max_iterations, log_escape_radius)
+    tile_colors[y, x] = sample_colors / len(offsets)
+
+    tile_region = (slice(tile_y - row_offset,
+                         tile_y - row_offset + tile_height),
+                   slice(tile_x, tile_x + tile_width))
+    with SharedBuffer.attach(colors) as colors:
+        colors.as_array((-1, width, 3))[tile_region] = \
+            np.rint(tile_colors).astype(np.uint8)
+
+    return x.size
+
+
+class MandelbrotRendererNumPy(CPUObject):
+
+    def __init__(self, logger, pool=None):
+        CPUObject.__init__(self, logger, pool)
+
+        self._palette = None
+        if is_numpy_accelerated():
+            self._palette = _get_palette(constants.COLOR_SCHEME)
+
+    def _get_color_scheme_palette(self, color_scheme=None):
+        if color_scheme is None:
+            return self._palette
+
+        return _get_palette(color_scheme)
+
+    def render(self, width, height, results, tasks, color_density=None,
+               regions=None, image=None, color_scheme=None):
+        # With regions, only they are rendered and pasted onto the image.
+        # The color scheme is a list of 0x00BBGGRR colors.
+        if regions is None or image is None:
+            return self.render_preview(
+                width, height, results, 1, color_density, color_scheme)
+
+        if not is_numpy_accelerated():
+            self._logger.error(
+                'No NumPy acceleration is available, please use CPU.')
+            return
+
+        iterations, z_values, dc, max_iterations, escape_radius = results
+        if color_density is None:
+            color_density = constants.get_color_density(max_iterations)
+        palette = self._get_color_scheme_palette(color_scheme)
+
+        for region_x, region_y, region_width, region_height in regions:
+            region = (slice(region_y, region_y + region_height),
+                      slice(region_x, region_x + region_width))
+            colors = _get_colors(
+                iterations.as_array((height, width))[region],
+                z_values.as_array((height, width))[region],
+                _get_color_density(dc, color_density), palette,
+                max_iterations, math.log(escape_radius, 2))
+            image.paste(Image.frombuffer(
+                'RGB', (region_width, region_height), colors,
+                'raw', 'RGB', 0, 1), (region_x, region_y))
+
+        return image
+
+    def render_preview(self, width, height, results, stride,
+                       color_density=None, color_scheme=None):
+        if not is_numpy_accelerated():
+            self._logger.error(
+                'No NumPy acceleration is available, please use CPU.')
+            return
+
+        iterations, z_values, dc, max_iterations, escape_radius = results
+        if color_density is None:
+            color_density = constants.get_color_density(max_iterations)
+
+        # Only every stride-th row and column, the preview is smaller
+        colors = _get_colors(
+            iterations.as_array((height, width))[::stride, ::stride],
+            z_values.as_array((height, width))[::stride, ::stride],
+            _get_color_density(dc, color_density),
+            self._get_color_scheme_palette(color_scheme),
+            max_iterations, math.log(escape_radius, 2))
+
+        return Image.frombuffer(
+            'RGB', (colors.shape[1], colors.shape[0]), colors,
+            'raw', 'RGB', 0, 1)
+
+
+class MandelbrotNumPy(MandelbrotGeneratorNumPy, MandelbrotRendererNumPy):
+
+    def __init__(self, logger, pool=None, cache=None):
+        MandelbrotGeneratorNumPy.__init__(self, logger, pool, cache)
+        MandelbrotRendererNumPy.__init__(self, logger, pool)
+
+    def generate_supersampled(self, width, height, real_axis_range,
+                              imag_axis_range, tasks, samples, adaptive=False,
+                              band=None, tile_size=None,
+                              max_iterations=constants.MAX_ITERATIONS,
+                              escape_radius=constants.ESCAPE_RADIUS,
+                              color_density=None, color_scheme=None):
+        # Every pixel is the average color of samples x samples points
+        # inside it, or only the pixels on the edges between iteration
+        # counts with adaptive sampling. The image is of the band, or of
+        # the whole frame without one.
+        if not is_numpy_accelerated():
+            self._logger.error(
+                'No NumPy acceleration is available, please use CPU.')
+            return
+
+        cmin = complex(real_axis_range[0], imag_axis_range[0])
+        cmax = complex(real_axis_range[1], imag_axis_range[1])
+        dc = cmax - cmin
+
+        if color_density is None:
+            color_density = constants.get_color_density(max_iterations)
+        # The palette is unpacked once and sent to the workers as a compact
+        # RGB lookup table
+        palette = self._get_color_scheme_palette(color_scheme)
+
+        band_y, band_height = band if band is not None else (0, height)
+        tiles = self._sort_tiles(
+            width, height, cmin, dc,
+            self._split_regions(width, height,
+                                [(0, band_y, width, band_height)], tile_size),
+            max_iterations, escape_radius)
+        colors = SharedBuffer('B', width * band_height * 3)
+        try:
+            tile_jobs = [(width, height, cmin, dc, max_iterations,
+                          escape_radius, tile, samples, adaptive,
+                          _get_color_density(abs(dc), color_density),
+                          palette, colors.descriptor, band_y)
+                         for tile in tiles]
+            sampled = self._parallelize(
+                tasks, _get_tile_supersampled_colors, tile_jobs, tiles)
+            self._logger.debug('%s of %s pixels supersampled'
+                               % (sum(sampled), width * band_height))
+
+            pixels = colors.as_array().copy()
+        finally:
+            colors.release()
+
+        return Image.frombuffer(
+            'RGB', (width, band_height), pixels, 'raw', 'RGB', 0, 1)
@@ -0,0 +1,326 @@
+import math
+import decimal
+
+try:
+    import numpy as np
+except ImportError:
+    NUMPY_ACCELERATION_AVAILABLE = False
+else:
+    NUMPY_ACCELERATION_AVAILABLE = True
+
+try:
+    import gmpy2
+except ImportError:
+    GMPY2_AVAILABLE = False
+else:
+    GMPY2_AVAILABLE = True
+
+from mandelbrot import constants
+from mandelbrot.mandelbrot_cpu import CPUObject
+from mandelbrot.shared_buffer import SharedBuffer
+
+# The iteration count of the pixels which have to be computed again with
+# another reference orbit
+GLITCHED = -1
+
+# A pixel is glitched when its orbit gets this much closer to zero than
+# the reference orbit (Pauldelbrot's criterion)
+GLITCH_TOLERANCE = 1e-3
+
+MAX_REFERENCES = 32
+
+# The extra decimal digits of the reference orbit over the pixel pitch
+PRECISION_MARGIN = 10
+
+# The iterations described by the series have to match the probe points
+# to this fraction of the distance between neighbouring pixels
+SERIES_TOLERANCE = 1e-6
+
+# The probe points are a grid of this many points per side over the frame
+SERIES_PROBES = 5
+
+
+def is_perturbation_available():
+    return NUMPY_ACCELERATION_AVAILABLE
+
+
+def is_gmpy2_available():
+    return GMPY2_AVAILABLE
+
+
+def _get_precision(digits):
+    # The number type and the context in which it has the given precision
+    if is_gmpy2_available():
+        bits = int(digits * math.log(10, 2)) + 16
+        return gmpy2.mpfr, gmpy2.local_context(gmpy2.context(),
+                                               precision=bits)
+
+    return decimal.Decimal, decimal.localcontext(decimal.Context(prec=digits))
+
+
+def _get_reference_orbit(center, max_iterations, escape_radius, digits):
+    # The orbit of the center in high precision, rounded to complex doubles.
+    # It ends early when the center escapes.
+    number, context = _get_precision(digits)
+
+    orbit = [complex(float(center[0]), float(center[1]))]
+    with context:
+        c_real, c_imag = number(center[0]), number(center[1])
+        z_real, z_imag = c_real, c_imag
+        escape_radius = number(escape_radius) ** 2
+
+        for iteration in range(max_iterations):
+            z_real, z_imag = (z_real * z_real - z_imag * z_imag + c_real,
+                              2 * z_real * z_imag + c_imag)
+            orbit.append(complex(float(z_real), float(z_imag)))
+
+            if z_real * z_real + z_imag * z_imag >= escape_radius:
+                break
+
+    return orbit
+
+
+def _get_series(orbit, max_iterations, escape_radius, pitch, probes):
+    # The offsets follow the reference as the series
+    # d = A * dc + B * dc^2 + C * dc^3 for the first iterations, so these
+    # are skipped. The coefficients are kept scaled by the radius of the
+    # probes, the series of u = dc / radius does not overflow.
+    # Returns the iteration to start from and the scaled coefficients.
+    radius = max([abs(probe) for probe in probes] + [0])
+    if not radius:
+        return 0, (1, 1, 0, 0)
+
+    a, b, c = radius + 0j, 0j, 0j
+    deltas = list(probes)
+    series = (0, (radius, a, b, c))
+    last_iteration = min(max_iterations, len(orbit) - 1)
+
+    for iteration in range(last_iteration):
+        reference = orbit[iteration]
+        # The series has to hold at every probe point to the precision of
+        # the pixels, which are |A| * pitch apart at this iteration
+        tolerance = SERIES_TOLERANCE * pitch * abs(a) / radius
+        for probe, delta in zip(probes, deltas):
+            u = probe / radius
+            z = abs(reference + delta)
+            if (abs(((c * u + b) * u + a) * u - delta) > tolerance or
+                    z >= escape_radius or
+                    z < GLITCH_TOLERANCE * abs(reference)):
+                return series
+
+        series = (iteration, (radius, a, b, c))
+        a, b, c = (2 * reference * a + radius,
+                   2 * reference * b + a * a,
+                   2 * reference * c + 2 * a * b)
+        deltas = [2 * reference * delta + delta * delta + probe
+                  for probe, delta in zip(probes, deltas)]
+
+    return series
+
+
+def _get_pixels_iterations(dc, orbit, max_iterations, escape_radius,
+                           skip=0, series=(1, 1, 0, 0)):
+    # The pixels follow the reference orbit Z as z = Z + d, where
+    # d' = 2 * Z * d + d * d + dc stays small enough for doubles.
+    # The pixels which the reference orbit cannot describe are glitched.
+    # The first iterations are skipped with the series of the offsets.
+    iterations = np.full(dc.shape, GLITCHED, np.int32)
+    z_values = np.zeros(dc.shape)
+
+    radius, a, b, c = series
+    u = dc / radius
+    index = np.arange(dc.size)
+    d = ((c * u + b) * u + a) * u
+    for iteration in range(skip, len(orbit)):
+        if not index.size:
+            break
+
+        reference = orbit[iteration]
+        z = reference + d
+        abs_z = np.abs(z)
+
+        escaped = abs_z >= escape_radius
+        glitched = abs_z < GLITCH_TOLERANCE * abs(reference)
+        finished = escaped | glitched
+        if iteration == max_iterations:
+            finished[:] = True
+
+        if finished.any():
+            escaped_index = index[escaped]
+            iterations[escaped_index] = iteration
+            z_values[escaped_index] = abs_z[escaped]
+
+            if iteration == max_iterations:
+                inside = ~escaped & ~glitched
+                iterations[index[inside]] = max_iterations
+                z_values[index[inside]] = abs_z[inside]
+                break
+
+            running = ~finished
+            index, d, dc = index[running], d[running], dc[running]
+
+        d = 2 * reference * d + d * d + dc
+
+    return iterations, z_values
+
+
+def _get_tile_iterations(args):
+    # Only the glitched pixels of the tile are computed, unless all are
+    (width, height, pitch, reference_offset, orbit, skip, series,
+     max_iterations, escape_radius, tile, glitched_only, iterations,
+     z_values) = args
+    tile_x, tile_y, tile_width, tile_height = tile
+
+    tile_region = (slice(tile_y, tile_y + tile_height),
+                   slice(tile_x, tile_x + tile_width))
+    with SharedBuffer.attach(iterations) as iterations, \
+            SharedBuffer.attach(z_values) as z_values, \
+            SharedBuffer.attach(orbit) as orbit:
+        tile_iterations = iterations.as_array((height, width))[tile_region]
+        tile_z_values = z_values.as_array((height, width))[tile_region]
+
+        if glitched_only:
+            y, x = np.nonzero(tile_iterations == GLITCHED)
+        else:
+            y, x = np.indices((tile_height, tile_width))
+            y, x = y.ravel(), x.ravel()
+
+        if x.size:
+            dc = (_get_pixel_offsets(width, height, pitch,
+                                     x + tile_x, y + tile_y) -
+                  reference_offset)
+            tile_iterations[y, x], tile_z_values[y, x] = \
+                _get_pixels_iterations(
+                    dc, orbit.as_array().view(np.complex128).tolist(),
+                    max_iterations, escape_radius, skip, series)
+
+        glitched = int(np.count_nonzero(tile_iterations == GLITCHED))
+        # The views have to be dropped before the memory is closed
+        del tile_iterations, tile_z_values
+
+    return glitched
+
+
+def _get_pixel_offsets(width, height, pitch, x, y):
+    # The offsets of the pixels from the center of the frame
+    return ((x - (width - 1) / 2.0) + 1j * (y - (height - 1) / 2.0)) * pitch
+
+
+def _get_probes(width, height, pitch, reference_offset):
+    # The offsets of a grid of pixels over the frame from the reference,
+    # including the corners, which are the farthest ones
+    probes = set()
+    for y in range(SERIES_PROBES):
+        for x in range(SERIES_PROBES):
+            probes.add(complex(_get_pixel_offsets(
+                width, height, pitch,
+                x * (width - 1) // (SERIES_PROBES - 1),
+                y * (height - 1) // (SERIES_PROBES - 1)) - reference_offset))
+
+    return sorted(probes - set([0j]), key=abs, reverse=True)
+
+
+class MandelbrotGeneratorPerturbation(CPUObject):
+
+    def __init__(self, logger, pool=None):
+        CPUObject.__init__(self, logger, pool)
+
+    def generate(self, width, height, center, scale, tasks, tile_size=None,
+                 max_iterations=constants.MAX_ITERATIONS,
+                 escape_radius=constants.ESCAPE_RADIUS):
+        # The center is a pair of decimal strings (or Decimals) with as
+        # many digits as the zoom needs, the scale is the width of the
+        # real axis
+        if not is_perturbation_available():
+            self._logger.error(
+                'No NumPy acceleration is available for the deep zoom.')
+            return
+
+        pitch = scale / float(max(width - 1, 1))
+        digits = max(int(-math.log10(pitch)), 0) + PRECISION_MARGIN
+        dc = complex(scale, pitch * (height - 1))
+
+        iterations = SharedBuffer('i', width * height)
+        z_values = SharedBuffer('d', width * height)
+        results = (iterations, z_values, abs(dc),
+                   max_iterations, escape_radius)
+
+        try:
+            self._generate_references(
+                width, height, center, pitch, digits, tasks, tile_size,
+                max_iterations, escape_radius, results)
+        except BaseException:
+            self.release(results)
+            raise
+
+        return results
+
+    def _generate_references(self, width, height, center, pitch, digits,
+                             tasks, tile_size, max_iterations, escape_radius,
+                             results):
+        iterations, z_values = results[:2]
+        tiles = self._split_tiles(width, height, tile_size)
+        reference, reference_offset = center, 0j
+
+        for references in range(1, MAX_REFERENCES + 1):
+            orbit = _get_reference_orbit(
+                reference, max_iterations, escape_radius, digits)
+            skip, series = _get_series(
+                orbit, max_iterations, escape_radius, pitch,
+                _get_probes(width, height, pitch, reference_offset))
+            orbit_buffer = SharedBuffer('d', 2 * len(orbit))
+            try:
+                orbit_buffer.as_array().view(np.complex128)[:] = orbit
+
+                tile_jobs = [(width, height, pitch, reference_offset,
+                              orbit_buffer.descriptor, skip, series,
+                              max_iterations, escape_radius, tile,
+                              references > 1,
+                              iterations.descriptor, z_values.descriptor)
+                             for tile in tiles]
+                glitched = self._parallelize(
+                    tasks, _get_tile_iterations, tile_jobs, tiles)
+            finally:
+                orbit_buffer.release()
+
+            # Only the tiles with glitched pixels are computed again
+            tiles = [tile for tile, tile_glitched in zip(tiles, glitched)
+                     if tile_glitched]
+            self._logger.debug(
+                ('Reference orbit %s of %s iterations, %s skipped, ' +
+                 '%s glitched pixels')
+                % (references, len(orbit) - 1, skip, sum(glitched)))
+            if not tiles:
+                return
+
+            reference, reference_offset = self._get_next_reference(
+                width, height, center, pitch, digits, iterations)
+
+        self._logger.error(
+            ('%s pixels are still glitched after %s reference orbits, ' +
+             'they are drawn as inside the set.')
+            % (sum(glitched), MAX_REFERENCES))
+        iterations_values = iterations.as_array()
+        iterations_values[iterations_values == GLITCHED] = max_iterations
+        del iterations_values
+
+    def _get_next_reference(self, width, height, center, pitch, digits,
+                            iterations):
+        # The middle one of the glitched pixels in the row order becomes
+        # the next reference, it lies in the largest glitch most often
+        glitched = np.flatnonzero(iterations.as_array() == GLITCHED)
+        y, x = divmod(int(glitched[len(glitched) // 2]), width)
+        reference_offset = _get_pixel_offsets(width, height, pitch, x, y)
+
+        number, context = _get_precision(digits)
+        with context:
+            reference = (number(center[0]) + number(reference_offset.real),
+                         number(center[1]) + number(reference_offset.imag))
+
+        return reference, reference_offset
+
+
+class MandelbrotPerturbation(MandelbrotGeneratorPerturbation):
+
+    def __init__(self, logger, pool=None):
+        MandelbrotGeneratorPerturbation.__init__(self, logger, pool)
@@ -0,0 +1,182 @@
+import os
+import sys
+import json
+import time
+import contextlib
+
+try:
+    import resource
+except ImportError:
+    RESOURCE_AVAILABLE = False
+else:
+    RESOURCE_AVAILABLE = True
+
+
+def get_peak_memory():
+    # The peak resident memory of the calling process in MB, or None where
+    # it cannot be measured
+    if not RESOURCE_AVAILABLE:
+        return None
+
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports it in KB, macOS in bytes
+    if sys.platform == 'darwin':
+        peak_memory /= 1024.0
+
+    return peak_memory / 1024.0
+
+
+def stage(metrics, name):
+    # Times the stage into the metrics, if there are any
+    if metrics is None:
+        return contextlib.nullcontext()
+
+    return metrics.stage(name)
+
+
+class Metrics(object):
+
+    # Collects the stages of the runs in the main process and the jobs run
+    # by the workers. The sink, if any, is called with the summary after
+    # every run of the Mandelbrot object the metrics are given to.
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.clear()
+
+    def clear(self):
+        self.begin_time = time.time()
+        # (name, begin, end) in the order the stages finished
+        self.stages = []
+        self.jobs = []
+        # (begin, end, tasks) of every parallel map over the workers
+        self.maps = []
+        self.counters = {}
+        self._stage_names = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        begin_time = time.time()
+        self._stage_names.append(name)
+        try:
+            yield
+        finally:
+            self._stage_names.pop()
+            self.stages.append((name, begin_time, time.time()))
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_map(self, begin_time, end_time, tasks):
+        self.maps.append((begin_time, end_time, tasks))
+
+    def add_job(self, name, tile, timing):
+        # The tile is the (x, y, width, height) of the job, if it has one,
+        # the timing is (pid, begin, end, peak memory) measured by the
+        # worker which ran the job
+        pid, begin_time, end_time, peak_memory = timing
+        self.jobs.append({
+            'name': name,
+            'stage': self._stage_names[-1] if self._stage_names else None,
+            'tile': tile,
+            'pid': pid, 'begin': begin_time, 'end': end_time,
+            'peak_memory': peak_memory, 'iterations': None
+        })
+
+    def add_tile_iterations(self, stage, iterations, width):
+        # The iteration totals of the tiles generated in the stage are
+        # summed from the iteration counts of the whole frame
+        values = iterations.as_array((-1, width))
+        for job in self.jobs:
+            if job['stage'] != stage or job['tile'] is None or \
+                    job['iterations'] is not None:
+                continue
+
+            tile_x, tile_y, tile_width, tile_height = job['tile']
+            if tile_y + tile_height <= values.shape[0]:
+                job['iterations'] = int(values[
+                    tile_y:tile_y + tile_height,
+                    tile_x:tile_x + tile_width].sum(dtype='int64'))
+        del values
+
+    def summary(self):
+        stages = {}
+        for name, begin_time, end_time in self.stages:
+            stages[name] = stages.get(name, 0) + end_time - begin_time
+
+        jobs = {}
+        for job in self.jobs:
+            job_time = job['end'] - job['begin']
+            summary = jobs.setdefault(job['name'], {
+                'jobs': 0, 'time': 0, 'max_time': 0, 'iterations': 0})
+            summary['jobs'] += 1
+            summary['time'] += job_time
+            summary['max_time'] = max(summary['max_time'], job_time)
+            summary['iterations'] += job['iterations'] or 0
+        for summary in jobs.values():
+            summary['mean_time'] = summary['time'] / summary['jobs']
+
+        # The workers are utilised for the part of the parallel maps they
+        # spent running jobs, the rest is scheduling, pickling and IPC
+        busy_times = {}
+        for job in self.jobs:
+            busy_times[job['pid']] = busy_times.get(job['pid'], 0) + \
+                job['end'] - job['begin']
+        map_time = sum(end_time - begin_time
+                       for begin_time, end_time, _ in self.maps)
+        worker_time = sum((end_time - begin_time) * tasks
+                          for begin_time, end_time, tasks in self.maps)
+        busy_time = sum(busy_times.values())
+
+        worker_memory = [job['peak_memory'] for job in self.jobs
+                         if job['peak_memory'] is not None]
+
+        return {
+            'wall_time': time.time() - self.begin_time,
+            'stages': stages,
+            'jobs': jobs,
+            'workers': {
+                'count': len(busy_times),
+                'busy_time': busy_time,
+                'map_time': map_time,
+                'utilisation': busy_time / worker_time if worker_time else 0,
+                'imbalance': (max(busy_times.values()) * len(busy_times) /
+                              busy_time) if busy_time else 0
+            },
+            'peak_memory_mb': {
+                'main': get_peak_memory(),
+                'workers': max(worker_memory) if worker_memory else None
+            },
+            'counters': dict(self.counters)
+        }
+
+    def emit(self):
+        if self.sink is not None:
+            self.sink(self.summary())
+
+    def save(self, filename):
+        with open(filename, 'w') as metrics_file:
+            json.dump({'summary': self.summary(), 'jobs': self.jobs},
+                      metrics_file, indent=2)
+
+    def save_chrome_trace(self, filename):
+        # The trace format of chrome://tracing and Perfetto, the stages are
+        # on the main process, every job on the worker which ran it
+        pid = os.getpid()
+        events = [{
+            'name': name, 'cat': 'stage', 'ph': 'X', 'pid': pid, 'tid': 0,
+            'ts': (begin_time - self.begin_time) * 1e6,
+            'dur': (end_time - begin_time) * 1e6
+        } for name, begin_time, end_time in self.stages]
+
+        events += [{
+            'name': job['name'], 'cat': 'job', 'ph': 'X',
+            'pid': job['pid'], 'tid': 0,
+            'ts': (job['begin'] - self.begin_time) * 1e6,
+            'dur': (job['end'] - job['begin']) * 1e6,
+            'args': {'stage': job['stage'], 'tile': job['tile'],
+                     'iterations': job['iterations']}
+        } for job in self.jobs]
+
+        with open(filename, 'w') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'},
+                      trace_file)
@@ -0,0 +1,95 @@
+import os
+import zlib
+import struct
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Compressed data is written out in chunks of at most this many bytes
+IDAT_SIZE = 1024 * 1024
+
+
+def _get_chunk(chunk_type, data):
+    checksum = zlib.crc32(chunk_type + data) & 0xffffffff
+    return struct.pack('>I', len(data)) + chunk_type + data + \
+        struct.pack('>I', checksum)
+
+
+class PNGWriter(object):
+
+    # Writes an 8-bit RGB PNG image row by row, so only the rows given to
+    # write() at once have to be in memory. The image is written next to
+    # the final name first and only renamed to it once it is complete.
+    def __init__(self, logger, filename, width, height):
+        self._logger = logger
+        self.width = width
+        self.height = height
+        self.rows = 0
+
+        self._filename = filename
+        self._temporary_filename = '%s.%s.tmp' % (filename, os.getpid())
+        self._file = open(self._temporary_filename, 'wb')
+        self._compressor = zlib.compressobj()
+        self._data = b''
+
+        self._file.write(PNG_SIGNATURE)
+        self._file.write(_get_chunk(b'IHDR', struct.pack(
+            '>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+
+    def write(self, image):
+        # Returns whether the rows were written
+        if image.size[0] != self.width or image.mode != 'RGB':
+            self._logger.error('Only RGB rows of width %s can be written.'
+                               % self.width)
+            return False
+
+        data = image.tobytes()
+        row_size = self.width * 3
+        # Every row starts with its filter type, 0 for no filtering
+        rows = b''.join(b'\x00' + data[begin:begin + row_size]
+                        for begin in range(0, len(data), row_size))
+
+        self._data += self._compressor.compress(rows)
+        self.rows += image.size[1]
+        self._write_data(IDAT_SIZE)
+
+        return True
+
+    def _write_data(self, size):
+        while len(self._data) >= size and self._data:
+            self._file.write(_get_chunk(b'IDAT', self._data[:IDAT_SIZE]))
+            self._data = self._data[IDAT_SIZE:]
+
+    def close(self):
+        if self._file is None:
+            return
+
+        if self.rows != self.height:
+            self._logger.error('%s of %s rows written to the image.'
+                               % (self.rows, self.height))
+            self.abort()
+            return
+
+        self._data += self._compressor.flush()
+        self._write_data(1)
+        self._file.write(_get_chunk(b'IEND', b''))
+        self._file.close()
+        self._file = None
+        os.replace(self._temporary_filename, self._filename)
+
+    def abort(self):
+        # The unfinished image is removed, the output path is left as it was
+        if self._file is None:
+            return
+
+        self._file.close()
+        self._file = None
+        os.remove(self._temporary_filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
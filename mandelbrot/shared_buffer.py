@@ -0,0 +1,140 @@
+import mmap
+from array import array
+from multiprocessing import shared_memory
+
+
+class SharedBuffer(object):
+
+    # A flat array of one of the array module typecodes placed in shared
+    # memory. The process that creates the buffer owns it and has to
+    # release() it, the worker processes attach() to it by its descriptor.
+    def __init__(self, typecode, length, name=None):
+        self.typecode = typecode
+        self.length = length
+
+        if name is None:
+            size = max(array(typecode).itemsize * length, 1)
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+            self._owner = True
+        else:
+            self._memory = _attach_shared_memory(name)
+            self._owner = False
+
+        self.name = self._memory.name
+        self._views = []
+
+    @classmethod
+    def attach(cls, descriptor):
+        # The buffers of a file have the offset in the file as well
+        if len(descriptor) == 4:
+            return FileBuffer.attach(descriptor)
+
+        name, typecode, length = descriptor
+        return cls(typecode, length, name)
+
+    @property
+    def descriptor(self):
+        return (self.name, self.typecode, self.length)
+
+    @property
+    def values(self):
+        view = self._memory.buf.cast(self.typecode)[:self.length]
+        self._views.append(view)
+        return view
+
+    def write(self, offset, values):
+        # Copies the values in at the offset without keeping a view, for
+        # the owners which write many times into a long-lived buffer
+        with self._memory.buf.cast(self.typecode) as view:
+            view[offset:offset + len(values)] = values
+
+    def as_array(self, shape=None):
+        import numpy as np
+
+        values = np.frombuffer(
+            self._memory.buf, self.typecode, self.length)
+        return values.reshape(shape) if shape else values
+
+    def close(self):
+        # Every view of the memory has to be released before it is unmapped
+        for view in self._views:
+            view.release()
+        self._views = []
+
+        self._memory.close()
+
+    def release(self):
+        self.close()
+        if self._owner:
+            self._memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FileBuffer(object):
+
+    # A read-only flat array mapped from a file at the given offset, every
+    # process maps the same pages of the file instead of copying them
+    def __init__(self, filename, typecode, length, offset=0):
+        self.typecode = typecode
+        self.length = length
+        self.filename = filename
+        self.offset = offset
+
+        with open(filename, 'rb') as mapped_file:
+            self._memory = mmap.mmap(
+                mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+
+    @classmethod
+    def attach(cls, descriptor):
+        filename, typecode, length, offset = descriptor
+        return cls(filename, typecode, length, offset)
+
+    @property
+    def descriptor(self):
+        return (self.filename, self.typecode, self.length, self.offset)
+
+    @property
+    def values(self):
+        size = array(self.typecode).itemsize * self.length
+        memory = memoryview(self._memory)
+        view = memory[self.offset:self.offset + size].cast(self.typecode)
+        self._views += [view, memory]
+        return view
+
+    def as_array(self, shape=None):
+        import numpy as np
+
+        values = np.frombuffer(
+            self._memory, self.typecode, self.length, self.offset)
+        return values.reshape(shape) if shape else values
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
+
+        self._memory.close()
+
+    def release(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _attach_shared_memory(name):
+    # The workers share the resource tracker of the process which created
+    # the memory, so attaching only registers the same name once more
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name)
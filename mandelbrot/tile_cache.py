@@ -0,0 +1,109 @@
+import os
+import hashlib
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    pass
+
+
+class LRUCache(object):
+
+    # Least recently used entries are evicted once the total size of the
+    # entries goes over max_bytes
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        if key not in self._entries:
+            return None
+
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key, value, size):
+        if key in self._entries:
+            self.size -= self._entries.pop(key)[1]
+
+        if size > self.max_bytes:
+            return
+
+        self._entries[key] = (value, size)
+        self.size += size
+
+        while self.size > self.max_bytes:
+            self.size -= self._entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+class TileCache(object):
+
+    # Iteration counts and |z| of generated tiles, kept in memory and
+    # optionally in a directory, which survives between the runs
+    def __init__(self, max_bytes, directory=None):
+        self._memory = LRUCache(max_bytes)
+        self._directory = directory
+        self.hits = 0
+        self.misses = 0
+
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _get_path(self, key):
+        name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self._directory, '%s.npz' % name)
+
+    def get(self, key):
+        tile = self._memory.get(key)
+
+        if tile is None and self._directory is not None:
+            path = self._get_path(key)
+            if os.path.exists(path):
+                with np.load(path) as tile_file:
+                    tile = (tile_file['iterations'], tile_file['z_values'])
+                self._memory.put(key, tile, tile[0].nbytes + tile[1].nbytes)
+
+        if tile is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return tile
+
+    def put(self, key, iterations, z_values):
+        tile = (iterations, z_values)
+        self._memory.put(key, tile, iterations.nbytes + z_values.nbytes)
+
+        if self._directory is not None:
+            path = self._get_path(key)
+            if not os.path.exists(path):
+                # Written next to the final name first, so that a reader
+                # never sees a partially written tile
+                temporary_path = '%s.%s.tmp' % (path, os.getpid())
+                with open(temporary_path, 'wb') as tile_file:
+                    np.savez(tile_file, iterations=iterations,
+                             z_values=z_values)
+                os.rename(temporary_path, path)
+
+    def clear(self):
+        self._memory.clear()
+
+
+def get_tile_cache(cache_size, directory=None):
+    # The cache size is given in MB, 0 and no directory turns the cache off
+    if not cache_size and directory is None:
+        return None
+
+    return TileCache(cache_size * 1024 * 1024, directory)
@@ -0,0 +1,244 @@
+import io
+import re
+import time
+import asyncio
+import concurrent.futures
+
+from mandelbrot import constants, mandelbrot_cpu, mandelbrot_numpy
+from mandelbrot.tile_cache import LRUCache
+from mandelbrot.worker_pool import WorkerPool
+
+TILE_SIZE = 256
+
+# Zoom level 0 is one tile of this plane, every level splits the tiles of
+# the previous one in four
+WORLD_PLANE = ([-2.5, 1.5], [-2.0, 2.0])
+
+# Deeper tiles have a pixel pitch close to the precision of doubles
+MAX_ZOOM = 36
+
+# The memory for the PNG tiles when no cache size is given
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_TIMEOUT = 15.0
+
+MAX_REQUEST_SIZE = 16 * 1024
+
+# The number of digits is bounded before they are converted, 2 ** MAX_ZOOM
+# has 11 of them
+TILE_PATH = re.compile(r'^/(\d{1,2})/(\d{1,11})/(\d{1,11})\.png$')
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+def get_tile_plane(z, x, y, tile_size=TILE_SIZE):
+    # The last pixel of a tile is one pixel before the first one of the
+    # next tile, so the tiles of a level join without seams
+    size = (WORLD_PLANE[0][1] - WORLD_PLANE[0][0]) / 2.0 ** z
+    span = size * (tile_size - 1) / tile_size
+    real_min = WORLD_PLANE[0][0] + x * size
+    imag_min = WORLD_PLANE[1][0] + y * size
+
+    return [real_min, real_min + span], [imag_min, imag_min + span]
+
+
+class TileServer(object):
+
+    # Serves the PNG tiles at /z/x/y.png over HTTP. The tiles are generated
+    # and rendered by the engine, as one job of the worker pool each, from
+    # up to tasks threads so the event loop never waits for them. The
+    # concurrent requests for the same tile share one run and the PNG data
+    # of the recent tiles is kept in memory.
+    def __init__(self, logger, tasks=1, numpy_acceleration=False,
+                 cache_size=DEFAULT_CACHE_SIZE, max_iterations=None,
+                 escape_radius=None, color_density=None, color_scheme=None):
+        self._logger = logger
+        self._tasks = tasks
+        self._max_iterations = max_iterations
+        self._escape_radius = escape_radius or constants.ESCAPE_RADIUS
+        self._color_density = color_density
+        self._color_scheme = color_scheme
+
+        # The workers are not forked from the server, whose threads and
+        # open client connections they would inherit
+        self._pool = WorkerPool(self._logger, 'forkserver')
+        if numpy_acceleration and mandelbrot_numpy.is_numpy_accelerated():
+            self._mandelbrot = mandelbrot_numpy.MandelbrotNumPy(
+                self._logger, self._pool)
+        else:
+            self._mandelbrot = mandelbrot_cpu.MandelbrotCPU(
+                self._logger, self._pool)
+        self._threads = concurrent.futures.ThreadPoolExecutor(tasks)
+        self._cache = LRUCache(cache_size)
+        # The futures of the tiles being generated
+        self._pending = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def close(self):
+        self._threads.shutdown()
+        self._pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_max_iterations(self, real_axis_range, imag_axis_range):
+        if self._max_iterations is None:
+            return constants.MAX_ITERATIONS
+        if self._max_iterations == 'auto':
+            return constants.get_adaptive_iterations(
+                TILE_SIZE, complex(real_axis_range[1] - real_axis_range[0],
+                                   imag_axis_range[1] - imag_axis_range[0]))
+
+        return self._max_iterations
+
+    async def get_tile(self, z, x, y):
+        key = (z, x, y)
+        png = self._cache.get(key)
+        if png is not None:
+            self.hits += 1
+            return png
+
+        future = self._pending.get(key)
+        if future is None:
+            self.misses += 1
+            future = self._submit(z, x, y)
+            self._pending[key] = future
+            future.add_done_callback(
+                lambda future: self._finish_tile(key, future))
+        else:
+            self.coalesced += 1
+
+        # A client which goes away does not cancel the tile for the others
+        return await asyncio.shield(future)
+
+    def _submit(self, z, x, y):
+        # A worker process which dies fails the tile with BrokenProcessPool
+        # and the next tile starts the pool again
+        return asyncio.get_running_loop().run_in_executor(
+            self._threads, self._get_tile_png, *get_tile_plane(z, x, y))
+
+    def _get_tile_png(self, real_axis_range, imag_axis_range):
+        results = self._mandelbrot.generate(
+            TILE_SIZE, TILE_SIZE, real_axis_range, imag_axis_range,
+            self._tasks, (TILE_SIZE, TILE_SIZE),
+            self._get_max_iterations(real_axis_range, imag_axis_range),
+            self._escape_radius)
+        try:
+            image = self._mandelbrot.render(
+                TILE_SIZE, TILE_SIZE, results, self._tasks,
+                self._color_density, color_scheme=self._color_scheme)
+        finally:
+            self._mandelbrot.release(results)
+
+        output = io.BytesIO()
+        image.save(output, 'PNG')
+
+        return output.getvalue()
+
+    def _finish_tile(self, key, future):
+        del self._pending[key]
+        if future.exception() is None:
+            self._cache.put(key, future.result(), len(future.result()))
+
+    async def _get_response(self, method, path):
+        # Returns the status, the content type and the body
+        if method not in ('GET', 'HEAD'):
+            return 405, 'text/plain', b'Only GET and HEAD are allowed\n'
+
+        match = TILE_PATH.match(path.split('?', 1)[0])
+        if match is None:
+            return 404, 'text/plain', b'Tiles are at /z/x/y.png\n'
+
+        z, x, y = map(int, match.groups())
+        if z > MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+            return 404, 'text/plain', b'No such tile\n'
+
+        try:
+            png = await self.get_tile(z, x, y)
+        except Exception as ex:
+            self._logger.error('Tile %s/%s/%s failed: %s' % (z, x, y, ex))
+            return 500, 'text/plain', b'The tile could not be generated\n'
+
+        return 200, 'image/png', png
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError,
+                        asyncio.LimitOverrunError, asyncio.TimeoutError,
+                        ConnectionError):
+                    break
+
+                begin_time = time.time()
+                lines = request.decode('latin-1').split('\r\n')
+                request_line = lines[0].split(' ')
+                headers = dict(
+                    (name.strip().lower(), value.strip())
+                    for name, _, value in (line.partition(':')
+                                           for line in lines[1:] if line))
+
+                if len(request_line) != 3 or \
+                        headers.get('content-length', '0') != '0':
+                    await self._write_response(
+                        writer, 400, 'text/plain', b'Bad request\n', False)
+                    break
+
+                method, path, version = request_line
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' or \
+                    (version == 'HTTP/1.1' and connection != 'close')
+
+                status, content_type, body = await self._get_response(
+                    method, path)
+                await self._write_response(
+                    writer, status, content_type,
+                    body if method != 'HEAD' else b'', keep_alive,
+                    len(body))
+                self._logger.debug('%s %s %s in %.5fs'
+                                   % (method, path, status,
+                                      time.time() - begin_time))
+
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _write_response(self, writer, status, content_type, body,
+                              keep_alive, content_length=None):
+        headers = [
+            'HTTP/1.1 %s %s' % (status, REASONS[status]),
+            'Content-Type: %s' % content_type,
+            'Content-Length: %s' % (len(body) if content_length is None
+                                    else content_length),
+            'Connection: %s' % ('keep-alive' if keep_alive else 'close')
+        ]
+        if status == 200:
+            # The tiles of a server never change
+            headers.append('Cache-Control: public, max-age=86400')
+
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') +
+                     body)
+        await writer.drain()
+
+    async def serve(self, address):
+        server = await asyncio.start_server(
+            self._handle_connection, address[0], address[1],
+            limit=MAX_REQUEST_SIZE)
+        self._logger.info('Serving the tiles at http://%s:%s/{z}/{x}/{y}.png'
+                          % address)
+
+        async with server:
+            await server.serve_forever()
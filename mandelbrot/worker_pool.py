@@ -0,0 +1,97 @@
+import threading
+import multiprocessing
+import concurrent.futures
+
+
+class WorkerPool(object):
+
+    # The processes are started on first use and kept alive between the
+    # calls. They are restarted only when the number of tasks changes or
+    # when one of them died, which fails the jobs in progress with a
+    # BrokenProcessPool error instead of leaving them waiting forever.
+    # The start method is one of multiprocessing's, the default if None.
+    def __init__(self, logger, start_method=None):
+        self._logger = logger
+        self._context = multiprocessing.get_context(start_method)
+        self._executor = None
+        self._tasks = 0
+        # The pool may be used from several threads
+        self._lock = threading.RLock()
+
+    @property
+    def tasks(self):
+        return self._tasks
+
+    def resize(self, tasks):
+        with self._lock:
+            if self._executor is not None and tasks == self._tasks:
+                return
+
+            self.close()
+
+            self._logger.debug('Starting worker pool with %s processes'
+                               % tasks)
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                tasks, self._context)
+            self._tasks = tasks
+
+    def _submit(self, tasks, func, data):
+        with self._lock:
+            self.resize(tasks)
+            try:
+                return self._executor.submit(func, data)
+            except concurrent.futures.process.BrokenProcessPool:
+                self._logger.error('A worker process died, the worker ' +
+                                   'pool is started again')
+                self.close()
+                self.resize(tasks)
+                return self._executor.submit(func, data)
+
+    def map(self, tasks, func, data):
+        futures = [self._submit(tasks, func, item) for item in data]
+        return [future.result() for future in futures]
+
+    def imap_unordered(self, tasks, func, data):
+        # The jobs which have not started when the caller stops iterating
+        # are cancelled
+        futures = [self._submit(tasks, func, item) for item in data]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def apply_async(self, tasks, func, data, callback=None,
+                    error_callback=None):
+        # The callbacks are called from a thread of the pool
+        def finish(future):
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                if error_callback is not None:
+                    error_callback(future.exception())
+            elif callback is not None:
+                callback(future.result())
+
+        future = self._submit(tasks, func, data)
+        future.add_done_callback(finish)
+
+        return future
+
+    def close(self):
+        with self._lock:
+            if self._executor is None:
+                return
+
+            self._logger.debug('Stopping worker pool with %s processes'
+                               % self._tasks)
+            self._executor.shutdown()
+            self._executor = None
+            self._tasks = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,31 @@
+import asyncio
+import logging
+import mandelbrot
+
+
+def start(arguments):
+    # Serves the tiles until interrupted
+    logger = logging.getLogger('mandelbrot_visualisation')
+
+    cache_size = arguments['cache_size'] * 1024 * 1024 or \
+        mandelbrot.tile_server.DEFAULT_CACHE_SIZE
+
+    with mandelbrot.tile_server.TileServer(
+            logger, arguments['tasks'], arguments['numpy'], cache_size,
+            arguments['max_iterations'], arguments['escape_radius'],
+            arguments['color_density'],
+            arguments['color_scheme']) as tile_server:
+        try:
+            asyncio.run(tile_server.serve(arguments['listen']))
+        except KeyboardInterrupt:
+            pass
+        except OSError as ex:
+            logger.error(ex)
+            return False
+
+        logger.info(('%s tiles served from the cache, %s generated, %s ' +
+                     'shared with a request for the same tile')
+                    % (tile_server.hits, tile_server.misses,
+                       tile_server.coalesced))
+
+    return True